@@ -1,23 +1,50 @@
-from django.contrib import admin
-from .models import Employee, AttendanceRecord, AttendanceSummary
+import zipfile
+from django import forms
+from django.contrib import admin, messages
+from django.core.validators import FileExtensionValidator
+from django.shortcuts import redirect, render
+from django.urls import path
+from . import import_jobs
+from .models import Site, Employee, AttendanceRecord, AttendanceSummary
+
+
+class EmployeeImportForm(forms.Form):
+    csv_file = forms.FileField(
+        label='Employees CSV', validators=[FileExtensionValidator(['csv'])],
+        help_text='Columns: employee_id, first_name, last_name, email, hire_date (YYYY-MM-DD); optional phone, '
+                  'department, position, is_active, sites (site codes separated by ;), photo'
+    )
+    photos = forms.FileField(
+        label='Photos ZIP', required=False, validators=[FileExtensionValidator(['zip'])],
+        help_text='Photos named <employee_id>.jpg, or as given in the photo column'
+    )
+
+
+@admin.register(Site)
+class SiteAdmin(admin.ModelAdmin):
+    list_display = ['code', 'name', 'address', 'created_at']
+    search_fields = ['code', 'name']
+    readonly_fields = ['created_at']
 
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
     list_display = ['employee_id', 'first_name', 'last_name', 'email', 'department', 'is_active', 'created_at']
-    list_filter = ['department', 'is_active', 'hire_date']
+    list_filter = ['department', 'is_active', 'hire_date', 'sites']
     search_fields = ['employee_id', 'first_name', 'last_name', 'email']
-    readonly_fields = ['face_encoding', 'created_at', 'updated_at']
+    readonly_fields = ['face_template_shape', 'face_template_dtype', 'created_at', 'updated_at']
+    filter_horizontal = ['sites']
+    change_list_template = 'admin/attendance/employee/change_list.html'
     
     fieldsets = (
         ('Basic Information', {
             'fields': ('employee_id', 'first_name', 'last_name', 'email', 'phone')
         }),
         ('Work Information', {
-            'fields': ('department', 'position', 'hire_date', 'is_active')
+            'fields': ('department', 'position', 'hire_date', 'sites', 'is_active')
         }),
         ('Face Recognition', {
-            'fields': ('profile_image', 'face_encoding'),
+            'fields': ('profile_image', 'face_template_shape', 'face_template_dtype'),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -25,6 +52,65 @@ class EmployeeAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         })
     )
+    
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='attendance_employee_import'),
+        ] + super().get_urls()
+    
+    def changelist_view(self, request, extra_context=None):
+        """The employee list, with the results of the user's finished imports"""
+        for job in import_jobs.user_jobs(request.user.pk):
+            self.report_import(request, job)
+        return super().changelist_view(request, extra_context)
+    
+    def report_import(self, request, job):
+        if job['state'] == 'running':
+            self.message_user(request, f"Import of {job['name']} is still running.", messages.INFO)
+        elif job['state'] == 'failed':
+            self.message_user(request, f"Import of {job['name']} failed: {job['message']}", messages.ERROR)
+        else:
+            self.message_user(
+                request,
+                f"Import of {job['name']}: {job['created']} employees imported, {job['enrolled']} faces enrolled.",
+                messages.SUCCESS
+            )
+            problems = job['problems']
+            if problems:
+                shown = '; '.join(problems[:20])
+                more = f' and {len(problems) - 20} more' if len(problems) > 20 else ''
+                self.message_user(request, f'{len(problems)} problems: {shown}{more}', messages.WARNING)
+    
+    def import_view(self, request):
+        """
+        Bulk import from an uploaded CSV and photo ZIP
+        The uploads are saved and handed to import_employees in a process of its
+        own; the result is reported on the employee list once it has finished.
+        """
+        if not self.has_add_permission(request):
+            return redirect('admin:attendance_employee_changelist')
+        
+        form = EmployeeImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            csv_file, photos = form.cleaned_data['csv_file'], form.cleaned_data['photos']
+            if photos and not zipfile.is_zipfile(photos):
+                form.add_error('photos', 'Not a valid ZIP archive')
+            else:
+                import_jobs.start_import(csv_file, photos, request.user.pk)
+                self.message_user(
+                    request,
+                    f'Importing {csv_file.name}; the result is shown here once it has finished.',
+                    messages.INFO
+                )
+                return redirect('admin:attendance_employee_changelist')
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import employees',
+            'form': form,
+        }
+        return render(request, 'admin/attendance/employee/import_form.html', context)
 
 
 @admin.register(AttendanceRecord)
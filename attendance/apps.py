@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AttendanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'attendance'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Recognition servers opt in to loading the cascade and gallery at boot
+        # instead of on the first scan; other processes stay lazy
+        if getattr(settings, 'FACE_RECOGNITION_WARM_UP', False):
+            from .recognition_pool import start_warm_up
+            start_warm_up()
@@ -1,8 +1,15 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.utils import timezone
 from .models import Employee, AttendanceRecord, AttendanceSummary
+from . import recognition_pool
+from .face_recognition_service import face_service
+from .face_tracking import FaceTracker
+from .timing import collect_timings, log_timings, timings_enabled
+from .web_views import record_scan
 
 
 class AttendanceNotificationConsumer(AsyncWebsocketConsumer):
@@ -184,3 +191,91 @@ class EmployeeDashboardConsumer(AsyncWebsocketConsumer):
             'type': 'employee_stats',
             'data': stats
         }))
+
+
+
+class RecognitionStreamConsumer(AsyncWebsocketConsumer):
+    """
+    Continuous face recognition for a kiosk camera
+    The kiosk sends binary JPEG frames as fast as it likes; only the newest
+    frame is kept, so frames that arrive while a scan is running replace each
+    other instead of queueing (latest-frame-wins). Scans run in a worker
+    thread, never on the event loop. Faces are followed from frame to frame
+    by a FaceTracker and each new face is matched once, in the recognition
+    pool when it is enabled; a confident match is recorded (subject to the
+    debounce window) and the result is sent back on the same socket.
+    ?site=<code>&location=<text> pin the kiosk like the HTTP scan.
+    """
+
+    async def connect(self):
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        self.site = params.get('site', [''])[0] or None
+        self.location = params.get('location', [''])[0] or self.site or ''
+
+        self.latest_frame = None
+        self.frame_ready = asyncio.Event()
+        self.tracker = FaceTracker(face_service)
+        self.faces_in_view = False
+        self.scanner = asyncio.ensure_future(self.scan_frames())
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        self.scanner.cancel()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if not bytes_data:
+            return
+        # Overwrite any frame still waiting: the scanner only ever needs the newest one
+        self.latest_frame = bytes_data
+        self.frame_ready.set()
+
+    async def scan_frames(self):
+        """Scan the newest frame whenever the previous scan has finished"""
+        while True:
+            await self.frame_ready.wait()
+            self.frame_ready.clear()
+            frame, self.latest_frame = self.latest_frame, None
+
+            try:
+                results = await database_sync_to_async(self.scan_frame, thread_sensitive=False)(frame)
+            except Exception as e:
+                results = [{'success': False, 'message': f'Error: {str(e)}'}]
+            for result in results:
+                await self.send(text_data=json.dumps({'type': 'recognition_result', **result}))
+
+    def scan_frame(self, frame):
+        """recognize_frame, logging its stage timings when ATTENDANCE_SCAN_TIMINGS is on"""
+        if not timings_enabled():
+            return self.recognize_frame(frame)
+        with collect_timings() as timings:
+            results = self.recognize_frame(frame)
+        if results:
+            log_timings(timings, path=self.scope['path'], site=self.site)
+        return results
+
+    def recognize_frame(self, frame):
+        """
+        Track the faces in one frame, match the new ones and record attendance on confident matches
+        Returns: list of result dicts for the kiosk, empty when nothing new happened
+        """
+        gray = face_service.decode_image_bytes(frame)
+        detected = self.tracker.update(gray)
+        tracks = self.tracker.pending()
+        if not tracks:
+            # Said once when the last face leaves the view, not on every frame of an empty view
+            if detected and self.faces_in_view and not self.tracker.tracks:
+                self.faces_in_view = False
+                return [{'success': False, 'message': 'No face detected in the image', 'confidence': 0.0}]
+            return []
+        self.faces_in_view = True
+
+        results = []
+        crops = [self.tracker.crop(gray, track) for track in tracks]
+        for track, (employee_pk, confidence_score, message) in zip(tracks, recognition_pool.match_faces(crops, site=self.site)):
+            track.identify(employee_pk, confidence_score)
+            if employee_pk is None:
+                results.append({'success': False, 'message': message, 'confidence': confidence_score})
+            else:
+                results.append(record_scan(employee_pk, confidence_score, location=self.location))
+        return results
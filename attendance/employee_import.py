@@ -0,0 +1,237 @@
+import csv
+import os
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .enrollment import enroll_employees, rebuild_gallery
+from .models import Employee, Site
+
+# CSV header; sites holds site codes separated by ';', photo names the image in the ZIP
+# (defaults to <employee_id>.jpg/.jpeg/.png)
+REQUIRED_COLUMNS = ['employee_id', 'first_name', 'last_name', 'email', 'hire_date']
+OPTIONAL_COLUMNS = ['phone', 'department', 'position', 'is_active', 'sites', 'photo']
+
+# is_active spellings; an empty cell means active
+TRUE_VALUES = {'', '1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+
+
+class EmployeeImporter:
+    """
+    Streaming employee import from a CSV and an optional ZIP of photos
+    Rows are read one at a time and inserted with bulk_create batch_size at
+    a time, each photo is copied straight from the archive into storage, so
+    neither file is held in memory. New employees are enrolled in parallel
+    afterwards and the gallery is rebuilt once, as bulk_create sends no
+    post_save.
+
+    Rows that cannot be imported (missing or invalid fields, unknown sites,
+    an employee_id or email that already exists) are skipped and listed in
+    `errors` as (line, employee_id, message); photo problems on imported rows
+    are listed in `warnings`.
+    """
+
+    def __init__(self, photos=None, batch_size=500):
+        """
+        Args:
+            photos: zipfile.ZipFile with the employee photos, or None
+            batch_size: employees inserted per bulk_create
+        """
+        self.photos = photos
+        self.batch_size = max(1, batch_size)
+        self.sites = {site.code: site for site in Site.objects.all()}
+        self.photo_index = self._index_photos(photos) if photos is not None else {}
+        self.created = []  # Imported employees, kept for enrollment
+        self.errors = []
+        self.warnings = []
+        self._seen_ids = set()
+        self._seen_emails = set()
+
+    @staticmethod
+    def _index_photos(photos):
+        """Archive members by full name and by lower-case file stem"""
+        index = {}
+        for info in photos.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith('__MACOSX/') or not name.lower().endswith(PHOTO_EXTENSIONS):
+                continue
+            index[name] = info
+            index.setdefault(os.path.splitext(os.path.basename(name))[0].lower(), info)
+        return index
+
+    def import_csv(self, csv_file, progress=None):
+        """
+        Import every row of an open text-mode CSV file
+        Args:
+            progress: optional callable(rows_read, created, skipped), called after every batch
+        Raises: ValidationError when the header lacks a required column
+        """
+        reader = csv.DictReader(csv_file)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValidationError(f"CSV is missing columns: {', '.join(missing)}")
+
+        batch = []
+        rows_read = 0
+        for rows_read, row in enumerate(reader, 1):
+            # Line numbers count the header, as a spreadsheet shows them
+            entry = self._build_row(rows_read + 1, row)
+            if entry is not None:
+                batch.append(entry)
+            if len(batch) >= self.batch_size:
+                self._insert_batch(batch)
+                batch = []
+                if progress is not None:
+                    progress(rows_read, len(self.created), len(self.errors))
+        self._insert_batch(batch)
+        if progress is not None:
+            progress(rows_read, len(self.created), len(self.errors))
+
+    def _build_row(self, line, row):
+        """
+        Validate one CSV row
+        Returns: (line, employee, sites, photo member or None), or None when the row is skipped
+        """
+        values = {column: (row.get(column) or '').strip() for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+        employee_id = values['employee_id']
+
+        is_active = values['is_active'].lower()
+        if is_active not in TRUE_VALUES | FALSE_VALUES:
+            self.errors.append((line, employee_id, f"is_active: {values['is_active']} is not yes or no"))
+            return None
+
+        employee = Employee(
+            employee_id=employee_id,
+            first_name=values['first_name'],
+            last_name=values['last_name'],
+            email=values['email'],
+            phone=values['phone'],
+            department=values['department'],
+            position=values['position'],
+            hire_date=values['hire_date'] or None,
+            is_active=is_active in TRUE_VALUES,
+        )
+        try:
+            # Uniqueness is checked per batch with one query instead of one per row
+            employee.full_clean(validate_unique=False)
+        except ValidationError as e:
+            message = '; '.join(f"{field}: {' '.join(errors)}" for field, errors in e.message_dict.items())
+            self.errors.append((line, employee_id, message))
+            return None
+
+        if employee.employee_id in self._seen_ids or employee.email in self._seen_emails:
+            self.errors.append((line, employee_id, "Duplicate employee_id or email in the CSV"))
+            return None
+
+        sites = []
+        for code in filter(None, (code.strip() for code in values['sites'].split(';'))):
+            if code not in self.sites:
+                self.errors.append((line, employee_id, f"Unknown site code: {code}"))
+                return None
+            sites.append(self.sites[code])
+
+        self._seen_ids.add(employee.employee_id)
+        self._seen_emails.add(employee.email)
+        return line, employee, sites, self._find_photo(line, employee_id, values['photo'])
+
+    def _find_photo(self, line, employee_id, photo):
+        if self.photos is None:
+            return None
+        info = self.photo_index.get(photo) if photo else self.photo_index.get(employee_id.lower())
+        if info is None:
+            self.warnings.append((line, employee_id, f"No photo {photo or employee_id} in the archive"))
+        elif info.file_size > MAX_PHOTO_BYTES:
+            self.warnings.append((line, employee_id, f"Photo {info.filename} is larger than {MAX_PHOTO_BYTES} bytes"))
+            info = None
+        return info
+
+    def _insert_batch(self, batch):
+        """Drop rows that clash with existing employees, then insert the rest with their sites and photos"""
+        if not batch:
+            return
+
+        employee_ids = [employee.employee_id for _, employee, _, _ in batch]
+        emails = [employee.email for _, employee, _, _ in batch]
+        taken_ids, taken_emails = set(), set()
+        for employee_id, email in Employee.objects.filter(
+            Q(employee_id__in=employee_ids) | Q(email__in=emails)
+        ).values_list('employee_id', 'email'):
+            taken_ids.add(employee_id)
+            taken_emails.add(email)
+
+        rows = []
+        for line, employee, sites, photo in batch:
+            if employee.employee_id in taken_ids or employee.email in taken_emails:
+                self.errors.append((line, employee.employee_id, "Employee with this employee_id or email already exists"))
+            else:
+                rows.append((line, employee, sites, photo))
+        if not rows:
+            return
+
+        try:
+            for line, employee, _, photo in rows:
+                if photo is not None:
+                    self._store_photo(line, employee, photo)
+
+            with transaction.atomic():
+                Employee.objects.bulk_create([employee for _, employee, _, _ in rows])
+                # Not every backend returns the new pks from bulk_create
+                pks = dict(Employee.objects.filter(
+                    employee_id__in=[employee.employee_id for _, employee, _, _ in rows]
+                ).values_list('employee_id', 'pk'))
+                memberships = []
+                for _, employee, sites, _ in rows:
+                    employee.pk = pks[employee.employee_id]
+                    memberships.extend(Employee.sites.through(employee_id=employee.pk, site_id=site.pk) for site in sites)
+                Employee.sites.through.objects.bulk_create(memberships)
+        except IntegrityError as e:
+            # Another import or form created one of these employees meanwhile
+            self._delete_photos(rows)
+            for line, employee, _, _ in rows:
+                self.errors.append((line, employee.employee_id, f"Batch could not be inserted: {e}"))
+            return
+        except BaseException:
+            # Any other failure: photos of employees that were never saved would be left in storage
+            self._delete_photos(rows)
+            raise
+
+        self.created.extend(employee for _, employee, _, _ in rows)
+
+    @staticmethod
+    def _delete_photos(rows):
+        """Remove the photos stored for rows whose insert failed"""
+        for _, employee, _, _ in rows:
+            if employee.profile_image:
+                try:
+                    employee.profile_image.delete(save=False)
+                except OSError:
+                    pass
+
+    def _store_photo(self, line, employee, info):
+        """Copy a photo from the archive into storage as the employee's profile image"""
+        extension = os.path.splitext(info.filename)[1].lower()
+        try:
+            with self.photos.open(info) as photo:
+                employee.profile_image.save(f'{employee.employee_id}{extension}', File(photo), save=False)
+        except Exception as e:
+            self.warnings.append((line, employee.employee_id, f"Photo {info.filename} could not be stored: {e}"))
+
+    def enroll(self, workers=None, chunk_size=500, progress=None):
+        """
+        Enroll the imported employees that have a photo, then rebuild the gallery once
+        Returns: (enrolled employee pks, list of (employee, message) failures, gallery rebuild message)
+        """
+        employees = [employee for employee in self.created if employee.profile_image]
+        if not employees:
+            return [], [], None
+
+        enrolled, failures = enroll_employees(employees, workers, chunk_size, progress)
+        message = None
+        if enrolled:
+            _, message = rebuild_gallery()
+        return enrolled, failures, message
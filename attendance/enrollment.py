@@ -0,0 +1,118 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.utils import timezone
+
+from .worker_processes import spawn_context
+
+# Encoder workers are spawned (see worker_processes), so models and the recognition
+# service are only imported inside functions.
+
+# Fields written by Employee.set_face_encoding; updated_at is set by hand since bulk_update skips auto_now
+TEMPLATE_FIELDS = ['face_template', 'face_template_shape', 'face_template_dtype', 'updated_at']
+
+
+def _init_encoder():
+    """Encoder worker start-up: set up Django and keep OpenCV to one thread, the pool provides the parallelism"""
+    import cv2
+    import django
+    django.setup()
+    cv2.setNumThreads(1)
+
+
+def encode_profile_image(path):
+    """
+    Read a profile image file and encode its face
+    Runs in the encoder pool, so only the file path travels to the worker
+    Returns: (face encoding or None, message)
+    """
+    from .face_recognition_service import face_service
+    if not path:
+        return None, "No profile image"
+    try:
+        with open(path, 'rb') as img_file:
+            image_bytes = img_file.read()
+    except OSError as e:
+        return None, f"Cannot read profile image: {e.strerror}"
+    return face_service.encode_face_from_bytes(image_bytes)
+
+
+def write_templates(employees, batch_size):
+    """Save the templates of a chunk of employees in one bulk update; no post_save is sent"""
+    from .models import Employee
+
+    if not employees:
+        return
+    now = timezone.now()
+    for employee in employees:
+        employee.updated_at = now
+    Employee.objects.bulk_update(employees, TEMPLATE_FIELDS, batch_size=batch_size)
+
+
+def enroll_employees(employees, workers=None, chunk_size=500, progress=None):
+    """
+    Encode the profile images of many employees and store their templates
+    Images are encoded across `workers` processes (default: CPU count; 1
+    encodes in this process) and templates are written chunk_size at a time.
+    The gallery is not touched; call rebuild_gallery() once afterwards.
+    Args:
+        employees: Employees with a profile_image; only pk and profile_image are needed
+        progress: optional callable(done, total, encoded, failed), called after every chunk_size images
+    Returns: (enrolled employee pks, list of (employee, message) for the employees that failed)
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    chunk_size = max(1, chunk_size)
+    employees = list(employees)
+    total = len(employees)
+    enrolled = []
+    failures = []
+    pending = []
+
+    paths = []
+    for employee in employees:
+        try:
+            paths.append(employee.profile_image.path)
+        except (ValueError, NotImplementedError):
+            paths.append(None)
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_encoder, mp_context=spawn_context()) if workers > 1 else None
+    try:
+        if executor is not None:
+            results = executor.map(encode_profile_image, paths, chunksize=16)
+        else:
+            results = map(encode_profile_image, paths)
+
+        for done, (employee, (face_encoding, message)) in enumerate(zip(employees, results), 1):
+            if face_encoding is None:
+                failures.append((employee, message))
+            else:
+                employee.set_face_encoding(face_encoding)
+                pending.append(employee)
+
+            if len(pending) >= chunk_size:
+                write_templates(pending, chunk_size)
+                enrolled.extend(employee.pk for employee in pending)
+                pending = []
+            if progress is not None and (done % chunk_size == 0 or done == total):
+                progress(done, total, len(enrolled) + len(pending), len(failures))
+
+        write_templates(pending, chunk_size)
+        enrolled.extend(employee.pk for employee in pending)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    return enrolled, failures
+
+
+def rebuild_gallery():
+    """
+    Retrain the gallery once after a bulk change that bypassed the model
+    signals, and tell every other process to reload it
+    Returns: success boolean and message
+    """
+    from .face_recognition_service import face_service
+    from .gallery_sync import publish_change
+
+    success, message = face_service.train_recognizer()
+    publish_change(reload=True)
+    return success, message
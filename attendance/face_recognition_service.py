@@ -3,23 +3,71 @@ import numpy as np
 from PIL import Image
 import base64
 import io
-from django.core.files.base import ContentFile
-from .models import Employee
+import os
+import threading
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.functional import LazyObject, empty
+from .gallery import GALLERY_BACKENDS, lbph_distance, map_arrays, template_digest, write_mapped_arrays
+from .gallery_sync import GalleryChangeFeed, get_change_feed
+from .models import Employee, Site
+from .timing import stage
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers may train concurrently, the last snapshot wins
+    fcntl = None
+
+
+# What predictions read: the gallery and its cached site shards (a read-only
+# mapping). A snapshot is never mutated; writers publish a new one.
+RecognizerSnapshot = namedtuple('RecognizerSnapshot', ['gallery', 'site_galleries'])
 
 
 class FaceRecognitionService:
     
+    # Every instantiated service, so model signals can keep each live recognizer in sync
+    live_services = weakref.WeakSet()
+    
+    # Compact the gallery once replaced/removed rows exceed this share of it
+    STALE_SAMPLE_RATIO = 0.25
+    
+    # Face detection tuning; any key can be overridden with settings.FACE_DETECTION
+    DETECTION_DEFAULTS = {
+        'MAX_DIMENSION': 640,  # Detect on a copy whose longest side is at most this many pixels
+        'SCALE_FACTOR': 1.1,
+        'MIN_NEIGHBORS': 5,
+        'MIN_FACE_RATIO': 0.1,  # Smallest face side, as a share of the frame's shorter side
+    }
+    
+    # Haar cascade window size; the detector cannot find anything smaller
+    CASCADE_WINDOW = 24
+    
+    # imdecode flags for decoding straight to grayscale at 1/N scale
+    REDUCED_GRAYSCALE_FLAGS = {
+        1: cv2.IMREAD_GRAYSCALE,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }
+    
     def __init__(self):
         # Initialize face detection cascade
+        self.cascade_path = None
         try:
-            self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self.cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+            self.face_cascade = cv2.CascadeClassifier(self.cascade_path)
         except (AttributeError, TypeError):
             # Fallback for opencv-python-headless or missing cascade
-            import os
             try:
                 if hasattr(cv2, '__file__') and cv2.__file__:
                     cascade_path = os.path.join(os.path.dirname(cv2.__file__), 'data', 'haarcascade_frontalface_default.xml')
                     if os.path.exists(cascade_path):
+                        self.cascade_path = cascade_path
                         self.face_cascade = cv2.CascadeClassifier(cascade_path)
                     else:
                         self.face_cascade = None
@@ -30,11 +78,57 @@ class FaceRecognitionService:
             
             if self.face_cascade is None:
                 print("Warning: Face cascade not available. Face detection may not work properly.")
-        # Initialize face recognizer
-        self.face_recognizer = cv2.face.LBPHFaceRecognizer_create()
-        self.is_trained = False
-        self.employee_map = {}
+        self._cascade_thread = threading.get_ident()
+        self._thread_state = threading.local()
+        
+        # Gallery used for matching, built on first use by the configured backend.
+        # Predictions read self.snapshot once and never lock; training, enrollment
+        # and removal hold the write lock, work on forks and swap in a new snapshot.
+        self.snapshot = None
+        self.loaded_version = None  # gallery_version() the current gallery was loaded or trained at
+        self.synced_version = None  # Change feed version the current gallery reflects
+        self._write_lock = threading.RLock()
+        FaceRecognitionService.live_services.add(self)
+    
+    @property
+    def gallery(self):
+        """Global gallery of the current snapshot, or None before training"""
+        snapshot = self.snapshot
+        return None if snapshot is None else snapshot.gallery
+    
+    @property
+    def site_galleries(self):
+        """Site code -> cached gallery shard of that site's employees"""
+        snapshot = self.snapshot
+        return MappingProxyType({}) if snapshot is None else snapshot.site_galleries
+    
+    @property
+    def is_trained(self):
+        return self.snapshot is not None
+    
+    def publish(self, gallery, site_galleries=None):
+        """Atomically replace the snapshot predictions read"""
+        self.snapshot = RecognizerSnapshot(gallery, MappingProxyType(dict(site_galleries or {})))
+    
+    def thread_cascade(self):
+        """
+        Cascade classifier owned by the calling thread
+        A CascadeClassifier keeps per-instance scratch buffers and must not run
+        in two threads at once, so other threads load their own copy.
+        """
+        cascade = getattr(self._thread_state, 'cascade', None)
+        if cascade is None:
+            cascade = self.face_cascade
+            if cascade is not None and threading.get_ident() != self._cascade_thread:
+                cascade = cv2.CascadeClassifier(self.cascade_path)
+            self._thread_state.cascade = cascade
+        return cascade
         
+    @classmethod
+    def detection_config(cls):
+        """Detection parameters: DETECTION_DEFAULTS updated with settings.FACE_DETECTION"""
+        return {**cls.DETECTION_DEFAULTS, **getattr(settings, 'FACE_DETECTION', {})}
+    
     def detect_faces(self, image):
         """
         Detect faces in an image using the cascade classifier
@@ -43,42 +137,87 @@ class FaceRecognitionService:
         Returns:
             List of rectangles (x, y, w, h) containing the faces
         """
-        if self.face_cascade is None:
-            raise ValueError("Face cascade classifier not initialized")
-            
         # Convert to grayscale for face detection
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return self.detect_faces_gray(gray)
+    
+    def detect_faces_gray(self, gray):
+        """
+        Detect faces on a downscaled copy of a grayscale frame
+        The cascade runs on an image no larger than MAX_DIMENSION and only looks
+        for faces of at least MIN_FACE_RATIO of the frame; boxes are mapped back
+        to full-resolution coordinates so crops keep their detail.
+        Returns:
+            Array of rectangles (x, y, w, h) in full-resolution coordinates
+        """
+        cascade = self.thread_cascade()
+        if cascade is None:
+            raise ValueError("Face cascade classifier not initialized")
+        
+        config = self.detection_config()
+        height, width = gray.shape[:2]
+        scale = min(1.0, config['MAX_DIMENSION'] / max(height, width))
+        if scale < 1.0:
+            small = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            small = gray
         
-        # Detect faces
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30),
-            flags=cv2.CASCADE_SCALE_IMAGE
-        )
+        min_side = max(self.CASCADE_WINDOW, int(config['MIN_FACE_RATIO'] * min(small.shape[:2])))
+        with stage('detect'):
+            faces = cascade.detectMultiScale(
+                small,
+                scaleFactor=config['SCALE_FACTOR'],
+                minNeighbors=config['MIN_NEIGHBORS'],
+                minSize=(min_side, min_side),
+                flags=cv2.CASCADE_SCALE_IMAGE
+            )
         
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=int)
+        
+        # Map the boxes back onto the full-resolution frame
+        faces = np.round(np.asarray(faces, dtype=np.float64) / scale).astype(int)
+        faces[:, 0] = np.clip(faces[:, 0], 0, width - 1)
+        faces[:, 1] = np.clip(faces[:, 1], 0, height - 1)
+        faces[:, 2] = np.minimum(faces[:, 2], width - faces[:, 0])
+        faces[:, 3] = np.minimum(faces[:, 3], height - faces[:, 1])
         return faces
     
-    def encode_face_from_base64(self, image_base64):
+    def decode_image_bytes(self, image_bytes):
         """
-        Extract face encoding from base64 image string using OpenCV
+        Decode an uploaded image straight to a grayscale array
+        JPEGs are scaled by the decoder itself (1/2, 1/4 or 1/8) while the longest
+        side stays at least twice MAX_DIMENSION, so no full-size colour frame is
+        ever built and face crops still come from more pixels than detection uses.
+        Returns: 2-D uint8 numpy array
+        """
+        with stage('decode'):
+            factor = 1
+            try:
+                # Only the header is parsed here; pixel data is left to OpenCV
+                width, height = Image.open(io.BytesIO(image_bytes)).size
+                keep = 2 * self.detection_config()['MAX_DIMENSION']
+                while factor < 8 and max(width, height) // (factor * 2) >= keep:
+                    factor *= 2
+            except Exception:
+                factor = 1
+            
+            gray = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), self.REDUCED_GRAYSCALE_FLAGS[factor])
+        if gray is None:
+            raise ValueError("Could not decode image data")
+        return gray
+    
+    def encode_face_from_bytes(self, image_bytes):
+        """
+        Extract face encoding from raw encoded image bytes (JPEG, PNG, ...)
         Returns: face encoding array or None if no face found
         """
         try:
-            # Decode base64 image
-            format, imgstr = image_base64.split(';base64,')
-            image_data = base64.b64decode(imgstr)
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Convert PIL image to numpy array
-            image_array = np.array(image)
+            gray = self.decode_image_bytes(image_bytes)
             
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-            
-            # Detect faces
-            faces = self.detect_faces(image_array)
+            # Detect faces on a downscaled copy, crop from the decoded frame
+            faces = self.detect_faces_gray(gray)
             
             if len(faces) == 0:
                 return None, "No face detected in the image"
@@ -98,65 +237,494 @@ class FaceRecognitionService:
         except Exception as e:
             return None, f"Error processing image: {str(e)}"
     
+    def encode_face_from_base64(self, image_base64):
+        """
+        Extract face encoding from base64 image string using OpenCV
+        Returns: face encoding array or None if no face found
+        """
+        try:
+            # Decode base64 image
+            with stage('decode'):
+                format, imgstr = image_base64.split(';base64,')
+                image_data = base64.b64decode(imgstr)
+        except Exception as e:
+            return None, f"Error processing image: {str(e)}"
+        
+        return self.encode_face_from_bytes(image_data)
+    
+    def encode_face(self, image):
+        """Extract face encoding from raw image bytes or a base64 data URL"""
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return self.encode_face_from_bytes(image)
+        return self.encode_face_from_base64(image)
+    
+    @staticmethod
+    def gallery_queryset():
+        """Employees whose templates make up the recognition gallery"""
+        return Employee.objects.filter(face_template__isnull=False, is_active=True)
+    
+    def gallery_version(self):
+        """
+        Cheap fingerprint of the gallery in the DB
+        Every save bumps updated_at and every delete/deactivation changes the
+        count, so a snapshot built from an older gallery will not match.
+        """
+        stats = self.gallery_queryset().aggregate(count=Count('id'), last_updated=Max('updated_at'))
+        if not stats['count']:
+            return None
+        return f"{stats['count']}:{stats['last_updated'].isoformat()}"
+    
+    @staticmethod
+    def gallery_backend():
+        """Gallery class selected by FACE_RECOGNITION_BACKEND ('lbph' or 'pca')"""
+        return GALLERY_BACKENDS[getattr(settings, 'FACE_RECOGNITION_BACKEND', 'lbph')]
+    
+    @staticmethod
+    def gallery_options():
+        """Backend fitting options from settings"""
+        return {'components': getattr(settings, 'FACE_RECOGNITION_PCA_COMPONENTS', 128)}
+    
+    @staticmethod
+    def snapshot_path():
+        """Location of the persisted recognizer snapshot"""
+        return getattr(settings, 'FACE_RECOGNIZER_SNAPSHOT_PATH',
+                       os.path.join(settings.BASE_DIR, 'var', 'recognizer', 'gallery.bin'))
+    
+    def save_snapshot(self, version):
+        """
+        Publish the gallery as a memory-mappable file shared by all workers
+        The file is written next to the target and renamed into place, so
+        readers never see a partial snapshot and existing maps stay valid.
+        """
+        path = self.snapshot_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as snapshot_file:
+            write_mapped_arrays(snapshot_file, self.gallery.to_arrays(), version=version)
+        os.replace(tmp_path, path)
+    
+    @contextmanager
+    def snapshot_lock(self):
+        """Exclusive lock held across processes while a snapshot is being trained"""
+        if fcntl is None:
+            yield
+            return
+        
+        path = self.snapshot_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def load_snapshot(self, version):
+        """
+        Attach to the published gallery if it matches the given gallery version
+        The vectors are mapped read-only rather than copied, so every worker
+        shares the same pages; enrolling into it copies the rows privately.
+        Returns: True when the snapshot was used
+        """
+        try:
+            meta, arrays = map_arrays(self.snapshot_path())
+            if version is None or meta.get('version') != version:
+                return False
+            gallery = self.gallery_backend().attach(arrays)
+        except (OSError, KeyError, ValueError):
+            return False
+        
+        self.publish(gallery)
+        self.loaded_version = version
+        return True
+    
+    def ensure_trained(self):
+        """
+        Make sure the gallery is loaded, preferring the persisted snapshot
+        Concurrent cold-start callers queue on the write lock, so only the
+        first one loads or trains and the rest reuse its result.
+        Returns: success boolean and message
+        """
+        if self.snapshot is not None:
+            return True, "Recognizer already trained"
+        
+        with self._write_lock:
+            if self.snapshot is not None:
+                return True, "Recognizer already trained"
+            
+            return self._load_or_train(self.gallery_version())
+    
+    def refresh(self):
+        """
+        Bring the gallery up to date with changes made in other processes
+        With the Redis change feed this is one GET when nothing changed, and
+        only the employees that changed are re-read. Without it (or while
+        Redis is unreachable) gallery_version() is compared with the loaded
+        version and the whole gallery is reloaded on a mismatch.
+        Returns: success boolean and message
+        """
+        feed = get_change_feed()
+        remote_version = feed.version() if feed is not None else None
+        
+        if remote_version is None:
+            version = self.gallery_version()
+            if self.snapshot is not None and version == self.loaded_version:
+                return True, "Recognizer up to date"
+            with self._write_lock:
+                return self._load_or_train(version)
+        
+        if self.snapshot is not None and remote_version == self.synced_version:
+            return True, "Recognizer up to date"
+        
+        with self._write_lock:
+            changes = None
+            if self.snapshot is not None:
+                changes = feed.changes_since(self.synced_version, remote_version)
+            if changes is None or GalleryChangeFeed.RELOAD in changes:
+                return self._load_or_train(self.gallery_version())
+            
+            self.apply_changes(changes)
+            self.synced_version = remote_version
+            return True, f"Applied {len(changes)} gallery changes"
+    
+    def apply_changes(self, changes):
+        """
+        Patch the live gallery with changes published by other processes
+        Args:
+            changes: employee pks to re-read, plus GalleryChangeFeed.SITES when
+                site membership changed
+        """
+        employee_pks = [change for change in changes if change != GalleryChangeFeed.SITES]
+        with self._write_lock:
+            if len(employee_pks) < len(changes):
+                self.invalidate_site_galleries()
+            
+            employees = {employee.pk: employee for employee in Employee.objects.filter(pk__in=employee_pks)}
+            for employee_pk in employee_pks:
+                employee = employees.get(employee_pk)
+                if employee is None:
+                    self.remove_employee(employee_pk)
+                else:
+                    self.sync_employee(employee)
+    
+    def _load_or_train(self, version):
+        """
+        Attach to the published snapshot, training it first if it is missing or stale
+        Processes that notice the same change queue on the snapshot lock, so
+        one of them trains and the others attach to the file it publishes.
+        """
+        # Changes published after this point are picked up by the next refresh()
+        feed = get_change_feed()
+        feed_version = feed.version() if feed is not None else None
+        
+        if self.load_snapshot(version):
+            success, message = True, f"Loaded snapshot with {len(self.gallery)} employees"
+        else:
+            with self.snapshot_lock():
+                if self.load_snapshot(version):
+                    success, message = True, f"Loaded snapshot with {len(self.gallery)} employees"
+                else:
+                    success, message = self.train_recognizer()
+        
+        if success:
+            self.synced_version = feed_version
+        return success, message
+    
     def train_recognizer(self):
-        """Train the face recognizer with all registered employees"""
+        """
+        Build the gallery from all registered employees and persist a snapshot
+        The new gallery is built off to the side while predictions keep using
+        the current one; the write lock is held throughout so enrollments made
+        meanwhile are applied to the new gallery rather than lost.
+        """
+        with self._write_lock:
+            return self._train_recognizer()
+    
+    def _train_recognizer(self):
         try:
-            faces = []
+            # Read the version first so concurrent changes make the snapshot stale
+            version = self.gallery_version()
             labels = []
-            self.employee_map = {}
+            templates = []
+            digests = []
             
-            employees = Employee.objects.filter(face_encoding__isnull=False, is_active=True)
+            employees = self.gallery_queryset().only('id', 'face_template', 'face_template_shape', 'face_template_dtype')
             
-            for idx, employee in enumerate(employees):
+            for employee in employees.iterator():
                 face_data = employee.get_face_encoding()
                 if face_data is not None:
-                    faces.append(np.array(face_data, dtype=np.uint8))
-                    labels.append(idx)
-                    self.employee_map[idx] = employee
-            
-            if len(faces) > 0:
-                self.face_recognizer.train(faces, np.array(labels))
-                self.is_trained = True
-                return True, f"Trained with {len(faces)} employees"
+                    labels.append(employee.pk)
+                    templates.append(face_data)
+                    digests.append(template_digest(employee.face_template))
+            
+            if len(templates) > 0:
+                gallery = self.gallery_backend().build(labels, templates, digests, **self.gallery_options())
+                self.publish(gallery)
+                self.loaded_version = version
+                self.save_snapshot(version)
+                # Swap the private copy for the shared map, like every other worker
+                self.load_snapshot(version)
+                return True, f"Trained with {len(gallery)} employees"
             else:
                 return False, "No employee faces found for training"
                 
         except Exception as e:
             return False, f"Training failed: {str(e)}"
     
-    def recognize_face(self, image_base64, confidence_threshold=50):
+    def enroll_employee(self, employee, face_data):
         """
-        Recognize face from base64 image against all registered employees using OpenCV
-        Returns: (employee, confidence_score) or (None, error_message)
+        Add or replace a single employee's vector in the live gallery
+        Args:
+            employee: Employee instance the template belongs to
+            face_data: 100x100 grayscale face crop
         """
-        try:
-            # Get face encoding from uploaded image
-            face_encoding, message = self.encode_face_from_base64(image_base64)
+        with self._write_lock:
+            snapshot = self.snapshot
+            if snapshot is None:
+                # The first recognition trains from the DB and picks this employee up
+                return
             
-            if face_encoding is None:
-                return None, 0.0, message
+            gallery = snapshot.gallery.fork()
+            vector = gallery.encode(face_data)
+            digest = template_digest(employee.face_template)
+            gallery.append(employee.pk, vector, digest)
+            self._compact_if_stale(gallery)
+            
+            site_galleries = {}
+            if snapshot.site_galleries:
+                employee_sites = set(employee.sites.values_list('code', flat=True))
+                for code, shard in snapshot.site_galleries.items():
+                    shard = shard.fork()
+                    if code in employee_sites:
+                        shard.append(employee.pk, vector, digest)
+                    else:
+                        shard.tombstone(employee.pk)
+                    self._compact_if_stale(shard)
+                    site_galleries[code] = shard
+            
+            self.publish(gallery, site_galleries)
+    
+    def remove_employee(self, employee_pk):
+        """Tombstone a deactivated or deleted employee in the live gallery and its site shards"""
+        with self._write_lock:
+            snapshot = self.snapshot
+            if snapshot is None:
+                return
             
-            # Train recognizer if not already trained
-            if not self.is_trained:
-                success, train_message = self.train_recognizer()
-                if not success:
-                    return None, 0.0, train_message
+            gallery, site_galleries = snapshot.gallery, dict(snapshot.site_galleries)
+            if employee_pk in gallery.rows:
+                gallery = self._without(gallery, employee_pk)
+            for code, shard in site_galleries.items():
+                if employee_pk in shard.rows:
+                    site_galleries[code] = self._without(shard, employee_pk)
             
-            # Predict using the trained recognizer
-            label, confidence = self.face_recognizer.predict(face_encoding)
+            self.publish(gallery, site_galleries)
+    
+    def _without(self, gallery, employee_pk):
+        """Fork of a gallery with one employee tombstoned"""
+        gallery = gallery.fork()
+        gallery.tombstone(employee_pk)
+        self._compact_if_stale(gallery)
+        return gallery
+    
+    def _compact_if_stale(self, gallery):
+        """Reclaim tombstoned rows once they make up a large share of a gallery"""
+        if gallery.tombstones > self.STALE_SAMPLE_RATIO * gallery.size:
+            gallery.compact()
+    
+    def site_gallery(self, site_code, snapshot=None):
+        """
+        Gallery shard holding only the employees assigned to a site
+        Shards are cut from the global gallery on first use, so building one
+        costs a single membership query and no template decoding.
+        Args:
+            snapshot: snapshot to cut the shard from, defaults to the current one
+        Returns: gallery shard, or None for an unknown site
+        """
+        snapshot = self.snapshot if snapshot is None else snapshot
+        shard = snapshot.site_galleries.get(site_code)
+        if shard is None:
+            if not Site.objects.filter(code=site_code).exists():
+                return None
+            employee_pks = Employee.sites.through.objects.filter(
+                site__code=site_code
+            ).values_list('employee_id', flat=True)
+            shard = snapshot.gallery.subset(employee_pks)
             
-            # Convert confidence to percentage (lower is better for LBPH)
-            confidence_score = max(0, 100 - confidence)
+            # Cache it without waiting on a writer; if one is busy or the
+            # snapshot has moved on, the shard is simply cut again next time
+            if self._write_lock.acquire(blocking=False):
+                try:
+                    if self.snapshot is snapshot:
+                        self.publish(snapshot.gallery, {**snapshot.site_galleries, site_code: shard})
+                finally:
+                    self._write_lock.release()
+        return shard
+    
+    def invalidate_site_galleries(self):
+        """Forget cached shards after site assignments change; they are re-cut lazily"""
+        with self._write_lock:
+            if self.snapshot is not None:
+                self.publish(self.snapshot.gallery)
+    
+    def sync_employee(self, employee):
+        """Bring the live gallery in line with an employee's saved state"""
+        with self._write_lock:
+            if self.snapshot is None:
+                return
             
-            if confidence_score >= confidence_threshold and label in self.employee_map:
-                employee = self.employee_map[label]
-                return employee, confidence_score, "Face recognized successfully"
+            if employee.is_active and employee.face_template:
+                if self.gallery.digest_for(employee.pk) != template_digest(employee.face_template):
+                    self.enroll_employee(employee, employee.get_face_encoding())
             else:
+                self.remove_employee(employee.pk)
+    
+    def predict(self, face_data, k=1, gallery=None):
+        """
+        Closest enrolled employees for a face crop
+        Args:
+            gallery: gallery or site shard to search, defaults to the global gallery
+        Returns: list of up to k (employee pk, distance) pairs, closest first;
+        100 - distance is the confidence score
+        """
+        gallery = self.gallery if gallery is None else gallery
+        return gallery.search(gallery.encode(face_data), k)
+    
+    def recognize_face(self, image, confidence_threshold=50, site=None):
+        """
+        Recognize face from an uploaded image against registered employees using OpenCV
+        Args:
+            image: raw encoded image bytes or a base64 data URL
+            site: kiosk site code; only that site's employees are searched, falling
+                back to all employees when FACE_RECOGNITION_SITE_FALLBACK is set
+        Returns: (employee, confidence_score) or (None, error_message)
+        """
+        try:
+            (employee_pk, confidence_score, message), = self.recognize_faces([image], confidence_threshold, site)
+            if employee_pk is None:
+                return None, confidence_score, message
+            
+            employee = Employee.objects.filter(pk=employee_pk).first()
+            if employee is None:
                 return None, confidence_score, "Face not recognized"
+            return employee, confidence_score, message
                 
         except Exception as e:
             return None, 0.0, f"Error during face recognition: {str(e)}"
     
+    def recognize_faces(self, images, confidence_threshold=50, site=None):
+        """
+        Recognize a batch of uploaded images in one pass
+        Each frame is decoded and cropped on its own; the crops are then
+        scored against the gallery together by match_faces.
+        Args:
+            images: list of raw encoded image bytes or base64 data URLs
+            site: kiosk site code, as for recognize_face
+        Returns: list of (employee_pk, confidence_score, message), one per image;
+        employee_pk is None when the image was not recognized
+        """
+        crops = [self.encode_face(image) for image in images]
+        results = [(None, 0.0, message) for _, message in crops]
+        pending = [i for i, (face_encoding, _) in enumerate(crops) if face_encoding is not None]
+        if not pending:
+            return results
+        
+        matched = self.match_faces([crops[i][0] for i in pending], confidence_threshold, site)
+        for i, result in zip(pending, matched):
+            results[i] = result
+        return results
+    
+    def match_faces(self, crops, confidence_threshold=50, site=None):
+        """
+        Match 100x100 face crops against the gallery, in one search per gallery
+        Args:
+            crops: face crops as produced by encode_face
+            site: kiosk site code, as for recognize_face
+        Returns: list of (employee_pk, confidence_score, message), one per crop;
+        employee_pk is None when the crop was not recognized
+        """
+        results = [(None, 0.0, "Face not recognized")] * len(crops)
+        pending = list(range(len(crops)))
+        if not pending:
+            return results
+        
+        # Load the gallery (or its snapshot) if needed and pick up other processes'
+        # changes: from the change feed, or by comparing gallery_version() without it
+        with stage('gallery_sync'):
+            success, train_message = self.refresh()
+        if not success:
+            return [(None, 0.0, train_message)] * len(crops)
+        
+        # One snapshot for the whole request, however many swaps happen meanwhile
+        snapshot = self.snapshot
+        galleries = [snapshot.gallery]
+        if site:
+            shard = self.site_gallery(site, snapshot)
+            if shard is None:
+                return [(None, 0.0, f"Unknown site: {site}")] * len(crops)
+            galleries = [shard]
+            if getattr(settings, 'FACE_RECOGNITION_SITE_FALLBACK', False):
+                galleries.append(snapshot.gallery)
+        
+        for gallery in galleries:
+            if not pending:
+                break
+            
+            # Match every still-unrecognized crop against the gallery at once
+            with stage('match'):
+                vectors = np.stack([gallery.encode(crops[i]) for i in pending])
+                found = gallery.search_many(vectors)
+            unmatched = []
+            for i, matches in zip(pending, found):
+                if not matches:
+                    unmatched.append(i)
+                    continue
+                employee_pk, distance = matches[0]
+                
+                # Convert distance to a confidence percentage (lower distance is better)
+                confidence_score = max(0, 100 - distance)
+                
+                if confidence_score >= confidence_threshold:
+                    results[i] = (employee_pk, confidence_score, "Face recognized successfully")
+                else:
+                    results[i] = (None, confidence_score, "Face not recognized")
+                    unmatched.append(i)
+            pending = unmatched
+        
+        return results
+    
+    def verify_face(self, employee_id, image, confidence_threshold=50):
+        """
+        1:1 verification of a claimed employee (typed ID or badge/QR scan)
+        Only the claimed employee's stored template is compared, with the LBPH
+        distance, so the cost is independent of headcount and the gallery does
+        not need to be loaded in this worker.
+        Args:
+            image: raw encoded image bytes or a base64 data URL
+        Returns: (employee, confidence_score, message); employee is None on failure
+        """
+        try:
+            employee = Employee.objects.filter(
+                employee_id=employee_id, is_active=True, face_template__isnull=False
+            ).first()
+            if employee is None:
+                return None, 0.0, "Employee not found or has no registered face"
+            
+            face_encoding, message = self.encode_face(image)
+            if face_encoding is None:
+                return None, 0.0, message
+            
+            with stage('match'):
+                distance = lbph_distance(employee.get_face_encoding(), face_encoding)
+            confidence_score = max(0, 100 - distance)
+            
+            if confidence_score >= confidence_threshold:
+                return employee, confidence_score, "Face verified successfully"
+            return None, confidence_score, "Face does not match employee"
+            
+        except Exception as e:
+            return None, 0.0, f"Error during face verification: {str(e)}"
+    
     def register_employee_face(self, employee, image_base64):
         """
         Register face encoding for an employee
@@ -168,7 +736,7 @@ class FaceRecognitionService:
             if face_encoding is None:
                 return False, message
             
-            # Store face encoding
+            # Store face encoding; the post_save signal enrolls it in live recognizers
             employee.set_face_encoding(face_encoding)
             employee.save()
             
@@ -185,5 +753,29 @@ class FaceRecognitionService:
         return self.register_employee_face(employee, image_base64)
 
 
+class LazyService(LazyObject):
+    """
+    Service instance built on first use
+    Importing a module that exposes a service must not load the cascade, so
+    management commands, migrations and dashboard-only workers never pay
+    for it; construction happens once, under a lock, on first attribute access.
+    """
+    
+    def __init__(self, factory):
+        self.__dict__['_factory'] = factory
+        self.__dict__['_setup_lock'] = threading.Lock()
+        super().__init__()
+    
+    def _setup(self):
+        with self._setup_lock:
+            if self._wrapped is empty:
+                self._wrapped = self._factory()
+    
+    @property
+    def is_built(self):
+        """Whether the service exists yet; checking does not build it"""
+        return self._wrapped is not empty
+
+
 # Global instance
-face_service = FaceRecognitionService()
+face_service = LazyService(FaceRecognitionService)
@@ -0,0 +1,172 @@
+import itertools
+import cv2
+from django.conf import settings
+from .timing import stage
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+class FaceTrack:
+    """One face followed across the frames of a stream"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.template = None  # Downscaled face patch followed between detections
+        self.misses = 0  # Consecutive frames the face was not found
+        self.employee_pk = None  # Identity once recognized, reused until the track is lost
+        self.confidence_score = 0.0
+        self.needs_scan = True  # Recognition is due on the next frame
+
+    def identify(self, employee_pk, confidence_score):
+        self.employee_pk = employee_pk
+        self.confidence_score = confidence_score
+        self.needs_scan = False
+
+
+class FaceTracker:
+    """
+    Cheap face tracking for a kiosk stream
+    While faces are in view the full-frame cascade only runs on every
+    DETECT_EVERY-th frame; in the frames between, each known face is found again by matching its last
+    patch (normalized cross-correlation) in a small window around its last
+    box, which costs well under a millisecond against tens for a detection.
+    Detections are matched to tracks by box overlap (IoU), which also
+    corrects the size and drift of followed boxes, so a face keeps its
+    identity across frames and is recognized once per track; faces not
+    recognized yet are retried on full-detection frames only.
+    """
+
+    # Tracking tuning; any key can be overridden with settings.FACE_TRACKING
+    TRACKING_DEFAULTS = {
+        'DETECT_EVERY': 5,  # Run full-frame detection on every Nth frame
+        'IOU_THRESHOLD': 0.3,  # Least overlap for a box to continue a track
+        'MAX_MISSES': 2,  # Frames a face may go unseen before its track is dropped
+        'SEARCH_MARGIN': 0.5,  # Search window around a face between detections, as a share of its size
+        'TRACK_SIZE': 32,  # Face side, in pixels, patches are matched at
+        'MIN_MATCH': 0.6,  # Least patch correlation for a face to count as found
+    }
+
+    def __init__(self, service):
+        self.service = service
+        self.config = self.tracking_config()
+        self.tracks = []
+        self.frames = 0
+        self._track_ids = itertools.count(1)
+
+    @classmethod
+    def tracking_config(cls):
+        """Tracking parameters: TRACKING_DEFAULTS updated with settings.FACE_TRACKING"""
+        return {**cls.TRACKING_DEFAULTS, **getattr(settings, 'FACE_TRACKING', {})}
+
+    def update(self, gray):
+        """
+        Follow faces into the next grayscale frame
+        Returns: True when full detection ran on this frame
+        """
+        # With no face to follow, detect on every frame so arrivals are picked up at once
+        if not self.tracks:
+            self.frames = 0
+        detect = self.frames % self.config['DETECT_EVERY'] == 0
+        self.frames += 1
+
+        if detect:
+            self._associate(self.service.detect_faces_gray(gray))
+        else:
+            with stage('track'):
+                for track in self.tracks:
+                    box = self._follow(gray, track)
+                    if box is None:
+                        track.misses += 1
+                    else:
+                        track.box, track.misses = box, 0
+
+        for track in self.tracks:
+            if track.misses == 0:
+                track.template = self._patch(gray, track.box)
+
+        self.tracks = [track for track in self.tracks if track.misses <= self.config['MAX_MISSES']]
+        return detect
+
+    def pending(self):
+        """Tracks whose face should be recognized on this frame"""
+        return [track for track in self.tracks if track.needs_scan]
+
+    @staticmethod
+    def crop(gray, track):
+        """The 100x100 face crop of a track, as produced by encode_face"""
+        x, y, w, h = track.box
+        return cv2.resize(gray[y:y+h, x:x+w], (100, 100))
+
+    def _associate(self, boxes):
+        """Match full-frame detections to tracks by IoU; unmatched boxes start new tracks"""
+        pairs = sorted(
+            ((box_iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True
+        )
+        matched_tracks = set()
+        matched_boxes = set()
+        for iou, t, b in pairs:
+            if iou < self.config['IOU_THRESHOLD']:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            track = self.tracks[t]
+            track.box, track.misses = tuple(int(v) for v in boxes[b]), 0
+            if track.employee_pk is None:
+                track.needs_scan = True
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                self.tracks.append(FaceTrack(next(self._track_ids), box))
+
+    def _patch(self, gray, box):
+        """Face patch scaled so the face is TRACK_SIZE pixels across"""
+        x, y, w, h = box
+        scale = self.config['TRACK_SIZE'] / max(w, h)
+        return cv2.resize(gray[y:y+h, x:x+w], (max(1, round(w * scale)), max(1, round(h * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    def _follow(self, gray, track):
+        """
+        Look for a track's face near its last box
+        Returns: the new (x, y, w, h) box, or None if the face was not found
+        """
+        x, y, w, h = track.box
+        height, width = gray.shape[:2]
+        margin = int(self.config['SEARCH_MARGIN'] * max(w, h))
+        left, top = max(0, x - margin), max(0, y - margin)
+        right, bottom = min(width, x + w + margin), min(height, y + h + margin)
+
+        # Search at the patch's scale
+        scale = self.config['TRACK_SIZE'] / max(w, h)
+        window = cv2.resize(gray[top:bottom, left:right],
+                            (max(1, round((right - left) * scale)), max(1, round((bottom - top) * scale))),
+                            interpolation=cv2.INTER_AREA)
+        template = track.template
+        if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]:
+            return None
+
+        scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (match_x, match_y) = cv2.minMaxLoc(scores)
+        if best < self.config['MIN_MATCH']:
+            return None
+
+        # Back to full-resolution coordinates; the size is kept until the next detection
+        bx = min(width - 1, left + round(match_x / scale))
+        by = min(height - 1, top + round(match_y / scale))
+        return bx, by, min(w, width - bx), min(h, height - by)
@@ -0,0 +1,502 @@
+import copy
+import hashlib
+import json
+import struct
+import numpy as np
+
+
+# LBPH parameters, identical to cv2.face.LBPHFaceRecognizer_create() defaults
+LBP_RADIUS = 1
+LBP_NEIGHBORS = 8
+LBP_GRID_X = 8
+LBP_GRID_Y = 8
+LBP_PATTERNS = 2 ** LBP_NEIGHBORS
+
+# Memory-mappable snapshot layout: magic, header length, JSON header, then
+# each array's raw bytes starting on an ARRAY_ALIGNMENT boundary
+SNAPSHOT_MAGIC = b'FACEGAL1'
+ARRAY_ALIGNMENT = 64
+
+
+def template_digest(template_bytes):
+    """Stable 64-bit fingerprint of a stored template, used to detect re-enrollment"""
+    digest = hashlib.blake2b(bytes(template_bytes), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def lbp_codes(face):
+    """
+    Circular LBP codes of a grayscale face crop
+    Mirrors OpenCV's LBPH implementation (bilinear sampling in float32 and the
+    same epsilon tie-break), so histograms match getHistograms() exactly.
+    """
+    src = face.astype(np.float32)
+    rows, cols = src.shape
+    r = LBP_RADIUS
+    center = src[r:rows - r, r:cols - r]
+    codes = np.zeros(center.shape, dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+
+    def shifted(dy, dx):
+        return src[r + dy:rows - r + dy, r + dx:cols - r + dx]
+
+    for n in range(LBP_NEIGHBORS):
+        x = np.float32(r * np.cos(2.0 * np.pi * n / np.float32(LBP_NEIGHBORS)))
+        y = np.float32(-r * np.sin(2.0 * np.pi * n / np.float32(LBP_NEIGHBORS)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = np.float32(x - fx), np.float32(y - fy)
+        w1 = np.float32((1 - tx) * (1 - ty))
+        w2 = np.float32(tx * (1 - ty))
+        w3 = np.float32((1 - tx) * ty)
+        w4 = np.float32(tx * ty)
+
+        sample = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes |= ((sample > center) | (np.abs(sample - center) < eps)).astype(np.int32) << n
+
+    return codes
+
+
+def lbp_histogram(face):
+    """
+    LBP spatial histogram of a face crop as raw per-cell counts
+    Returns: (uint8 vector of LBP_GRID_X * LBP_GRID_Y * 256 counts, pixels per cell)
+    Dividing by the cell size gives OpenCV's normalized LBPH histogram.
+    """
+    codes = lbp_codes(face)
+    cell_h = codes.shape[0] // LBP_GRID_Y
+    cell_w = codes.shape[1] // LBP_GRID_X
+    cells = codes[:LBP_GRID_Y * cell_h, :LBP_GRID_X * cell_w]
+    cells = cells.reshape(LBP_GRID_Y, cell_h, LBP_GRID_X, cell_w).transpose(0, 2, 1, 3)
+    cells = cells.reshape(LBP_GRID_Y * LBP_GRID_X, cell_h * cell_w)
+
+    offsets = (np.arange(LBP_GRID_Y * LBP_GRID_X) * LBP_PATTERNS)[:, None]
+    counts = np.bincount((cells + offsets).ravel(), minlength=LBP_GRID_Y * LBP_GRID_X * LBP_PATTERNS)
+    return counts.astype(np.uint8), cell_h * cell_w
+
+
+def _aligned(offset):
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def write_mapped_arrays(file, arrays, **meta):
+    """
+    Write arrays so map_arrays() can expose them without copying
+    The JSON header carries the meta values and each array's dtype, shape
+    and offset; 0-d arrays are stored in the header itself.
+    """
+    specs = {}
+    blobs = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        if array.ndim == 0:
+            specs[name] = {'dtype': array.dtype.str, 'value': array.item()}
+            continue
+        array = np.ascontiguousarray(array)
+        specs[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        blobs.append((offset, array))
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({'meta': meta, 'arrays': specs}).encode()
+    file.write(SNAPSHOT_MAGIC + struct.pack('<Q', len(header)) + header)
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + 8 + len(header))
+    written = len(SNAPSHOT_MAGIC) + 8 + len(header)
+    for offset, array in blobs:
+        file.write(b'\0' * (data_start + offset - written))
+        file.write(array.data)
+        written = data_start + offset + array.nbytes
+
+
+def map_arrays(path):
+    """
+    Map a file written by write_mapped_arrays() read-only
+    Every process mapping the same file shares its pages, and the mapping
+    stays valid if the file is replaced afterwards.
+    Returns: (meta dict, dict of read-only arrays)
+    """
+    with open(path, 'rb') as snapshot_file:
+        prefix = snapshot_file.read(len(SNAPSHOT_MAGIC) + 8)
+        if len(prefix) != len(SNAPSHOT_MAGIC) + 8 or not prefix.startswith(SNAPSHOT_MAGIC):
+            raise ValueError("Not a gallery snapshot")
+        header_length, = struct.unpack('<Q', prefix[len(SNAPSHOT_MAGIC):])
+        header = json.loads(snapshot_file.read(header_length))
+
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + 8 + header_length)
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        if 'value' in spec:
+            arrays[name] = np.array(spec['value'], dtype=dtype)
+            continue
+        shape = tuple(spec['shape'])
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=int(np.prod(shape)),
+                                     offset=data_start + spec['offset']).reshape(shape)
+    return header['meta'], arrays
+
+
+class GalleryIndex:
+    """
+    All enrolled face vectors in one contiguous matrix
+    Rows are appended in place (capacity doubles when full) and removed by
+    tombstoning, so enrollment and removal never rebuild the matrix.
+
+    A writer works on a fork(): forks share the vector storage, but rows are
+    only ever written past the parent's size and compaction allocates new
+    storage, so readers of the parent never see a fork's changes.
+
+    The matrix is stored feature-major (dimensions x capacity) so scoring a
+    query reads contiguous memory. Subclasses define how a face crop becomes
+    a vector (encode) and how vectors are scored (distances); distances are
+    on a 0-100 scale where 100 - distance is the confidence score.
+    """
+
+    name = None
+    vector_dtype = None
+
+    def __init__(self, dimensions, capacity=1024):
+        self.vectors = np.zeros((dimensions, capacity), dtype=self.vector_dtype)
+        self.labels = np.full(capacity, -1, dtype=np.int64)  # Employee pk per row
+        self.digests = np.zeros(capacity, dtype=np.int64)  # Template fingerprint per row
+        self.live = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self.rows = {}  # Employee pk -> row
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def capacity(self):
+        return len(self.labels)
+
+    @property
+    def tombstones(self):
+        return self.size - len(self.rows)
+
+    def digest_for(self, label):
+        row = self.rows.get(label)
+        return None if row is None else int(self.digests[row])
+
+    def encode(self, face):
+        """Turn a 100x100 grayscale face crop into a gallery vector"""
+        raise NotImplementedError
+
+    def distances(self, vector):
+        """Distance from a query vector to each of the first `size` rows"""
+        raise NotImplementedError
+
+    def distances_many(self, vectors):
+        """Distances from each query vector (one per row) to each of the first `size` rows"""
+        if len(vectors) == 0:
+            return np.empty((0, self.size), dtype=np.float32)
+        return np.stack([self.distances(vector) for vector in vectors])
+
+    @classmethod
+    def fit(cls, templates, **options):
+        """Create an empty index whose encoder is fitted to the given templates"""
+        raise NotImplementedError
+
+    @classmethod
+    def build(cls, labels, templates, digests, **options):
+        """Fit an index to the templates and enroll every one of them"""
+        gallery = cls.fit(templates, **options)
+        for label, template, digest in zip(labels, templates, digests):
+            gallery.append(label, gallery.encode(template), digest)
+        return gallery
+
+    def append(self, label, vector, digest=0):
+        """Add (or replace) the vector for a label"""
+        self.tombstone(label)
+        if self.size == self.capacity:
+            self._resize(max(1024, 2 * self.capacity))
+
+        row = self.size
+        self.vectors[:, row] = vector
+        self.labels[row] = label
+        self.digests[row] = digest
+        self.live[row] = True
+        self.rows[label] = row
+        self.size += 1
+        return row
+
+    def tombstone(self, label):
+        """Hide a label's row from search; returns False if it was not enrolled"""
+        row = self.rows.pop(label, None)
+        if row is None:
+            return False
+        self.live[row] = False
+        return True
+
+    def compact(self):
+        """Drop tombstoned rows, into new storage since forks may share the current one"""
+        keep = np.flatnonzero(self.live[:self.size])
+        size = len(keep)
+        vectors = np.zeros_like(self.vectors)
+        vectors[:, :size] = self.vectors[:, keep]
+        self.vectors = vectors
+        for name, fill in (('labels', -1), ('digests', 0), ('live', False)):
+            old = getattr(self, name)
+            new = np.full(self.capacity, fill, dtype=old.dtype)
+            new[:size] = old[keep]
+            setattr(self, name, new)
+        self.size = size
+        self.rows = {int(label): row for row, label in enumerate(self.labels[:size])}
+
+    def fork(self):
+        """
+        Copy-on-write copy for a writer
+        Shares the vectors, labels and digests; only the live flags and the
+        row map are copied. Only the most recent index may be forked, since
+        two forks of one parent would append into the same rows.
+        """
+        index = copy.copy(self)
+        index.live = self.live.copy()
+        index.rows = dict(self.rows)
+        return index
+
+    def _resize(self, capacity):
+        vectors = np.zeros((self.vectors.shape[0], capacity), dtype=self.vector_dtype)
+        vectors[:, :self.size] = self.vectors[:, :self.size]
+        self.vectors = vectors
+        for name, fill in (('labels', -1), ('digests', 0), ('live', False)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def search(self, vector, k=1):
+        """
+        Closest live rows to a query vector
+        Returns: list of up to k (label, distance) pairs, closest first
+        """
+        return self.search_many(np.asarray(vector)[None], k)[0]
+
+    def search_many(self, vectors, k=1):
+        """
+        Closest live rows to each of several query vectors, scored together
+        Returns: one list of up to k (label, distance) pairs per query, closest first
+        """
+        if not self.rows:
+            return [[] for _ in range(len(vectors))]
+
+        distances = self.distances_many(vectors)
+        distances[:, ~self.live[:self.size]] = np.inf
+
+        k = min(k, len(self.rows))
+        best = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        best = np.take_along_axis(best, np.argsort(np.take_along_axis(distances, best, axis=1), axis=1), axis=1)
+        return [
+            [(int(self.labels[row]), float(query_distances[row])) for row in query_best]
+            for query_distances, query_best in zip(distances, best)
+        ]
+
+    def subset(self, labels):
+        """New index holding copies of the given labels' live rows, with the same encoder"""
+        rows = sorted(self.rows[label] for label in set(labels) if label in self.rows)
+        size = len(rows)
+        index = self.from_model_arrays(self.model_arrays(), capacity=max(1024, 2 * size))
+        index.vectors[:, :size] = self.vectors[:, rows]
+        index.labels[:size] = self.labels[rows]
+        index.digests[:size] = self.digests[rows]
+        index.live[:size] = True
+        index.size = size
+        index.rows = {int(label): row for row, label in enumerate(index.labels[:size])}
+        return index
+
+    def model_arrays(self):
+        """Encoder state that has to be persisted alongside the vectors"""
+        return {}
+
+    @classmethod
+    def from_model_arrays(cls, arrays, capacity):
+        """Create an empty index from persisted encoder state"""
+        raise NotImplementedError
+
+    def to_arrays(self):
+        """Live rows and encoder state as plain arrays, for persisting"""
+        live_rows = np.flatnonzero(self.live[:self.size])
+        return {
+            'backend': np.array(self.name),
+            'vectors': self.vectors[:, live_rows],
+            'labels': self.labels[live_rows],
+            'digests': self.digests[live_rows],
+            **self.model_arrays(),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild an index from arrays produced by to_arrays()"""
+        if str(arrays['backend']) != cls.name:
+            raise ValueError(f"Snapshot was built by the {arrays['backend']} backend")
+
+        labels = arrays['labels']
+        size = len(labels)
+        index = cls.from_model_arrays(arrays, capacity=max(1024, 2 * size))
+        index.vectors[:, :size] = arrays['vectors']
+        index.labels[:size] = labels
+        index.digests[:size] = arrays['digests']
+        index.live[:size] = True
+        index.size = size
+        index.rows = {int(label): row for row, label in enumerate(labels)}
+        return index
+
+    @classmethod
+    def attach(cls, arrays):
+        """
+        Index over arrays produced by to_arrays() without copying them
+        Meant for read-only memory maps: capacity equals size, so the first
+        append moves the rows into private memory instead of writing the map.
+        """
+        if str(arrays['backend']) != cls.name:
+            raise ValueError(f"Snapshot was built by the {arrays['backend']} backend")
+
+        labels = arrays['labels']
+        size = len(labels)
+        index = cls.from_model_arrays(arrays, capacity=0)
+        index.vectors = arrays['vectors']
+        index.labels = labels
+        index.digests = arrays['digests']
+        index.live = np.ones(size, dtype=bool)
+        index.size = size
+        index.rows = {int(label): row for row, label in enumerate(labels)}
+        return index
+
+
+class LBPHGallery(GalleryIndex):
+    """
+    LBP spatial histograms matched with a vectorized chi-square
+    Distances are on the same scale as LBPHFaceRecognizer.predict.
+    """
+
+    name = 'lbph'
+    vector_dtype = np.uint8
+    DIMENSIONS = LBP_GRID_X * LBP_GRID_Y * LBP_PATTERNS
+
+    # Histogram bins scored per step, bounds the float32 scratch memory of a search
+    SEARCH_CHUNK_BINS = 256
+
+    def __init__(self, capacity=1024, cell_size=None):
+        super().__init__(self.DIMENSIONS, capacity)
+        self.cell_size = cell_size
+
+    @classmethod
+    def fit(cls, templates, **options):
+        return cls()
+
+    def encode(self, face):
+        histogram, cell_size = lbp_histogram(face)
+        if self.cell_size is None:
+            self.cell_size = cell_size
+        elif cell_size != self.cell_size:
+            raise ValueError("Face template size does not match the gallery")
+        return histogram
+
+    def distances(self, histogram):
+        """
+        OpenCV's HISTCMP_CHISQR_ALT, sum(2 * (g - q)^2 / (g + q)), against every row
+        Bins where the query is empty contribute 2 * g, so those collapse into
+        the row total and only the query's non-empty bins need to be gathered.
+        """
+        query_bins = np.flatnonzero(histogram)
+        query = histogram[query_bins].astype(np.float32)[:, None]
+
+        matched = np.zeros(self.size, dtype=np.float32)
+        gathered = np.zeros(self.size, dtype=np.float32)
+        for start in range(0, len(query_bins), self.SEARCH_CHUNK_BINS):
+            bins = query_bins[start:start + self.SEARCH_CHUNK_BINS]
+            chunk_query = query[start:start + self.SEARCH_CHUNK_BINS]
+            gallery = self.vectors[bins, :self.size].astype(np.float32)
+            gathered += gallery.sum(axis=0)
+            gallery -= chunk_query
+            diff_sq = gallery * gallery
+            gallery += 2 * chunk_query
+            matched += (diff_sq / gallery).sum(axis=0)
+
+        row_total = np.float32(LBP_GRID_X * LBP_GRID_Y * self.cell_size)
+        return 2 * (matched + row_total - gathered) / self.cell_size
+
+    def model_arrays(self):
+        return {'cell_size': np.array(self.cell_size or 0)}
+
+    @classmethod
+    def from_model_arrays(cls, arrays, capacity):
+        return cls(capacity=capacity, cell_size=int(arrays['cell_size']) or None)
+
+
+class PCAGallery(GalleryIndex):
+    """
+    Eigenfaces-style backend: face crops projected onto a PCA subspace
+    Each employee is one unit-length float32 vector and a search is a single
+    matrix-vector product. The distance is 100 * (1 - cosine similarity), so
+    the confidence score is the cosine similarity as a percentage.
+    """
+
+    name = 'pca'
+    vector_dtype = np.float32
+
+    # Faces used to fit the basis; enough to capture the face subspace
+    # without an O(gallery) eigendecomposition
+    TRAINING_SAMPLE = 2000
+
+    def __init__(self, mean, components, capacity=1024):
+        super().__init__(components.shape[0], capacity)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, templates, components=128, **options):
+        """
+        Fit the mean face and the top principal components
+        Uses the N x N Gram matrix (the Eigenfaces trick), since N is far
+        smaller than the 10000 pixels of a face crop.
+        """
+        templates = list(templates)
+        if len(templates) > cls.TRAINING_SAMPLE:
+            picks = np.random.default_rng(0).choice(len(templates), cls.TRAINING_SAMPLE, replace=False)
+            templates = [templates[i] for i in picks]
+
+        samples = np.stack([np.asarray(t, dtype=np.float32).ravel() for t in templates])
+        mean = samples.mean(axis=0)
+        samples -= mean
+
+        eigenvalues, eigenvectors = np.linalg.eigh(samples @ samples.T)
+        order = np.argsort(eigenvalues)[::-1][:components]
+        order = order[eigenvalues[order] > 1e-6 * max(eigenvalues.max(), 1e-12)]
+        if len(order) == 0:
+            raise ValueError("PCA backend needs at least 2 distinct enrolled faces")
+
+        basis = eigenvectors[:, order].T @ samples
+        basis /= np.linalg.norm(basis, axis=1, keepdims=True)
+        return cls(mean, basis)
+
+    def encode(self, face):
+        projected = self.components @ (np.asarray(face, dtype=np.float32).ravel() - self.mean)
+        norm = np.linalg.norm(projected)
+        return projected / norm if norm > 0 else projected
+
+    def distances(self, vector):
+        return np.clip(100 * (1 - vector @ self.vectors[:, :self.size]), 0, 200)
+
+    def distances_many(self, vectors):
+        return np.clip(100 * (1 - np.asarray(vectors, dtype=np.float32) @ self.vectors[:, :self.size]), 0, 200)
+
+    def model_arrays(self):
+        return {'mean': self.mean, 'components': self.components}
+
+    @classmethod
+    def from_model_arrays(cls, arrays, capacity):
+        return cls(arrays['mean'], arrays['components'], capacity=capacity)
+
+
+def lbph_distance(face, other):
+    """LBPH chi-square distance between two face crops, on the LBPHGallery.search scale"""
+    gallery = LBPHGallery(capacity=1)
+    gallery.append(0, gallery.encode(face))
+    return gallery.search(gallery.encode(other))[0][1]
+
+
+GALLERY_BACKENDS = {
+    LBPHGallery.name: LBPHGallery,
+    PCAGallery.name: PCAGallery,
+}
@@ -0,0 +1,109 @@
+import threading
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class GalleryChangeFeed:
+    """
+    Fleet-wide gallery change log in Redis
+    A counter is bumped on every gallery change, and a sorted set scores each
+    changed employee pk (or SITES for site membership) with the counter value
+    of its latest change. A process that last synced at version v picks up
+    everything newer with one range query, so it only re-reads the employees
+    that changed; the set holds at most one entry per employee. Bulk changes
+    record RELOAD instead, telling processes to attach to the rebuilt snapshot.
+    """
+
+    VERSION_KEY = 'attendance:gallery:version'
+    CHANGES_KEY = 'attendance:gallery:changes'
+    SITES = 'sites'
+    RELOAD = 'reload'
+
+    def __init__(self, url):
+        # Short timeouts: a scan falls back to the DB check instead of hanging on Redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def publish(self, employee_pks=(), sites=False, reload=False):
+        """
+        Record a change and bump the version
+        Returns: the new version, or None if Redis is unreachable
+        """
+        members = [str(pk) for pk in employee_pks]
+        if sites:
+            members.append(self.SITES)
+        if reload:
+            members.append(self.RELOAD)
+        try:
+            # Set the score from the incremented counter inside one Lua call, so a
+            # reader never sees a version whose changes are not recorded yet
+            return int(self.client.eval(
+                "local v = redis.call('INCR', KEYS[1]) "
+                "for _, m in ipairs(ARGV) do redis.call('ZADD', KEYS[2], v, m) end "
+                "return v",
+                2, self.VERSION_KEY, self.CHANGES_KEY, *members
+            ))
+        except redis.RedisError:
+            return None
+
+    def version(self):
+        """Current fleet-wide version (0 before any change), or None if Redis is unreachable"""
+        try:
+            return int(self.client.get(self.VERSION_KEY) or 0)
+        except redis.RedisError:
+            return None
+
+    def changes_since(self, version, until):
+        """
+        Members changed after `version`, up to and including `until`
+        Returns: list of employee pks plus SITES if site membership changed
+        and RELOAD if the whole gallery was rebuilt, or None when the range cannot be answered (Redis reset or unreachable)
+        """
+        if version is None or until < version:
+            return None
+        try:
+            members = self.client.zrangebyscore(self.CHANGES_KEY, f'({version}', until)
+        except redis.RedisError:
+            return None
+
+        changes = []
+        for member in members:
+            member = member.decode()
+            changes.append(member if member in (self.SITES, self.RELOAD) else int(member))
+        return changes
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_change_feed():
+    """
+    This process's change feed, created on first use
+    Returns: GalleryChangeFeed, or None when FACE_RECOGNITION_REDIS_URL is
+    unset or the redis package is missing
+    """
+    global _feed
+    url = getattr(settings, 'FACE_RECOGNITION_REDIS_URL', None)
+    if not url or redis is None:
+        return None
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = GalleryChangeFeed(url)
+    return _feed
+
+
+def publish_change(employee_pks=(), sites=False, reload=False):
+    """
+    Announce a gallery change to other processes once the current transaction commits
+    reload=True follows a bulk change that bypassed the model signals (and
+    a rebuilt snapshot); processes reload the gallery instead of patching it.
+    """
+    feed = get_change_feed()
+    if feed is not None:
+        transaction.on_commit(lambda: feed.publish(employee_pks, sites=sites, reload=reload))
@@ -0,0 +1,133 @@
+import json
+import os
+import secrets
+import shutil
+import subprocess
+import sys
+import threading
+from django.conf import settings
+from django.utils import timezone
+
+# Admin imports run as `manage.py import_employees --job <dir>` in a process of their own,
+# not in the request: the uploads are saved in a job directory, and the command leaves
+# its result there in status.json for the admin to report on a later page load.
+
+STATUS_FILE = 'status.json'
+LOG_FILE = 'import.log'
+PID_FILE = 'pid'  # Written by the server that started the job; status.json belongs to the command
+
+
+def jobs_dir():
+    """Where job directories are kept: settings.EMPLOYEE_IMPORT_DIR, outside MEDIA_ROOT as uploads hold personal data"""
+    return os.fspath(getattr(settings, 'EMPLOYEE_IMPORT_DIR', settings.BASE_DIR / 'employee_imports'))
+
+
+def read_status(job_dir):
+    try:
+        with open(os.path.join(job_dir, STATUS_FILE)) as status_file:
+            return json.load(status_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_status(job_dir, **changes):
+    """Merge changes into the job's status; replaced in one step so readers never see half a file"""
+    status = {**(read_status(job_dir) or {}), **changes}
+    path = os.path.join(job_dir, STATUS_FILE)
+    with open(f'{path}.tmp', 'w') as status_file:
+        json.dump(status, status_file)
+    os.replace(f'{path}.tmp', path)
+
+
+def _save_upload(upload, path):
+    """Copy an upload to disk chunk by chunk"""
+    with open(path, 'wb') as destination:
+        for chunk in upload.chunks():
+            destination.write(chunk)
+
+
+def start_import(csv_upload, photos_upload, user_pk):
+    """
+    Save the uploads in a new job directory and start import_employees on them
+    Returns: job id
+    """
+    job_id = f'{timezone.now():%Y%m%d-%H%M%S}-{secrets.token_hex(4)}'
+    job_dir = os.path.join(jobs_dir(), job_id)
+    os.makedirs(job_dir)
+    try:
+        csv_path = os.path.join(job_dir, 'employees.csv')
+        _save_upload(csv_upload, csv_path)
+        command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'import_employees', csv_path, '--job', job_dir]
+        if photos_upload is not None:
+            photos_path = os.path.join(job_dir, 'photos.zip')
+            _save_upload(photos_upload, photos_path)
+            command += ['--photos', photos_path]
+
+        write_status(job_dir, state='running', user=user_pk, name=csv_upload.name, started=timezone.now().isoformat())
+        with open(os.path.join(job_dir, LOG_FILE), 'wb') as log:
+            process = subprocess.Popen(
+                command, cwd=settings.BASE_DIR, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+        with open(os.path.join(job_dir, PID_FILE), 'w') as pid_file:
+            pid_file.write(str(process.pid))
+    except Exception:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    # Reap the process when it exits so it does not linger as a zombie of this server
+    threading.Thread(target=process.wait, name=f'employee-import-{job_id}', daemon=True).start()
+    return job_id
+
+
+def _log_tail(job_dir, lines=5):
+    try:
+        with open(os.path.join(job_dir, LOG_FILE), errors='replace') as log:
+            return ' '.join(log.read().splitlines()[-lines:])
+    except OSError:
+        return ''
+
+
+def _is_running(job_dir):
+    """Whether the job's process is alive; unknown counts as alive"""
+    try:
+        with open(os.path.join(job_dir, PID_FILE)) as pid_file:
+            pid = int(pid_file.read())
+    except (OSError, ValueError):
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def user_jobs(user_pk):
+    """
+    The user's import jobs, oldest first
+    Finished jobs are deleted as they are returned, so each result is reported
+    once; a job whose process died without writing a result is returned failed.
+    Returns: list of status dicts
+    """
+    try:
+        job_ids = sorted(os.listdir(jobs_dir()))
+    except FileNotFoundError:
+        return []
+
+    jobs = []
+    for job_id in job_ids:
+        job_dir = os.path.join(jobs_dir(), job_id)
+        status = read_status(job_dir)
+        if status is None or status.get('user') != user_pk:
+            continue
+        if status['state'] == 'running' and not _is_running(job_dir):
+            # Re-read: the process may have finished between the two reads
+            status = read_status(job_dir)
+            if status['state'] == 'running':
+                status.update(state='failed', message=f'The import stopped unexpectedly: {_log_tail(job_dir)}')
+        if status['state'] != 'running':
+            shutil.rmtree(job_dir, ignore_errors=True)
+        jobs.append(status)
+    return jobs
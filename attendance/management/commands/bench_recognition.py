@@ -0,0 +1,360 @@
+import base64
+import datetime
+import json
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from attendance.face_recognition_service import FaceRecognitionService
+from attendance.face_tracking import box_iou
+from attendance.gallery import GALLERY_BACKENDS, map_arrays, write_mapped_arrays
+from attendance.models import Employee
+
+
+def latency_stats(seconds):
+    """Percentiles of per-item timings, plus the single-core rate they imply"""
+    ms = 1000 * np.asarray(seconds, dtype=np.float64)
+    mean_ms = float(ms.mean())
+    return {
+        'mean_ms': round(mean_ms, 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'per_core_per_second': round(1000 / mean_ms, 1) if mean_ms else None,
+    }
+
+
+def timed(func, *args, **kwargs):
+    """(result, seconds) of one call"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the face matching backends on the same gallery, face detection settings on the same '
+            'images, or (--pipeline) every recognition stage across gallery and frame sizes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=list(GALLERY_BACKENDS),
+                            choices=list(GALLERY_BACKENDS), help='Backends to compare')
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Use N synthetic face crops instead of the enrolled employees')
+        parser.add_argument('--probes', type=int, default=200, help='Number of probe images to match')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for synthetic data and probes')
+        parser.add_argument('--detection', action='store_true',
+                            help='Compare full-resolution detection with the configured FACE_DETECTION instead')
+        parser.add_argument('--images', nargs='+', default=[],
+                            help='Images for --detection (defaults to employee profile images)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per image for --detection')
+        parser.add_argument('--pipeline', action='store_true',
+                            help='Time each recognition stage on synthetic galleries of every --sizes')
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000, 50000],
+                            help='Gallery sizes for --pipeline')
+        parser.add_argument('--frame-sizes', nargs='+', default=['640x480', '1280x720', '1920x1080'],
+                            help='Camera frame sizes (WxH) for the --pipeline decode and detection stages')
+        parser.add_argument('--db', action='store_true',
+                            help='Also time loading each --pipeline gallery from the database; the synthetic '
+                                 'employees are inserted in a transaction that is rolled back')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['detection']:
+            self.emit(self.bench_detection(options['images'], options['repeat']), options['output'])
+            return
+        if options['pipeline']:
+            self.emit(self.bench_pipeline(options), options['output'])
+            return
+
+        rng = np.random.default_rng(options['seed'])
+
+        if options['synthetic']:
+            labels, templates = self.synthetic_gallery(rng, options['synthetic'])
+        else:
+            labels, templates = self.enrolled_gallery()
+        if len(templates) < 2:
+            raise CommandError('Need at least 2 face templates; enroll employees or pass --synthetic N')
+
+        probe_labels, probes = self.make_probes(rng, labels, templates, options['probes'])
+
+        results = {
+            'gallery_size': len(templates),
+            'probes': len(probes),
+            'backends': {name: self.bench_backend(GALLERY_BACKENDS[name], labels, templates, probe_labels, probes)
+                         for name in options['backends']},
+        }
+        self.emit(results, options['output'])
+
+    def emit(self, results, output):
+        report = json.dumps(results, indent=2)
+        if output:
+            with open(output, 'w') as report_file:
+                report_file.write(report + '\n')
+            self.stderr.write(f'Report written to {output}')
+        else:
+            self.stdout.write(report)
+
+    def enrolled_gallery(self):
+        labels = []
+        templates = []
+        employees = FaceRecognitionService.gallery_queryset().only(
+            'id', 'face_template', 'face_template_shape', 'face_template_dtype')
+        for employee in employees.iterator():
+            labels.append(employee.pk)
+            templates.append(employee.get_face_encoding())
+        return labels, templates
+
+    @staticmethod
+    def synthetic_gallery(rng, count):
+        """Smooth random 100x100 crops; distinct per label, stable under small perturbations"""
+        templates = []
+        for _ in range(count):
+            noise = rng.integers(0, 256, (100, 100), dtype=np.uint8)
+            templates.append(cv2.GaussianBlur(noise, (0, 0), rng.uniform(1.0, 3.0)))
+        return list(range(count)), templates
+
+    @staticmethod
+    def make_probes(rng, labels, templates, count):
+        """Perturbed copies of gallery templates: brightness shift, sensor noise, slight blur"""
+        picks = rng.integers(0, len(templates), count)
+        probes = []
+        for i in picks:
+            probe = templates[i].astype(np.float32) + rng.uniform(-15, 15) + rng.normal(0, 4, templates[i].shape)
+            probe = cv2.GaussianBlur(np.clip(probe, 0, 255).astype(np.uint8), (3, 3), 0.6)
+            probes.append(probe)
+        return [labels[i] for i in picks], probes
+
+    @staticmethod
+    def bench_backend(backend, labels, templates, probe_labels, probes):
+        digests = [0] * len(labels)
+        options = FaceRecognitionService.gallery_options()
+
+        start = time.perf_counter()
+        gallery = backend.build(labels, templates, digests, **options)
+        build_seconds = time.perf_counter() - start
+
+        encode_times = []
+        search_times = []
+        correct = 0
+        for expected, probe in zip(probe_labels, probes):
+            start = time.perf_counter()
+            vector = gallery.encode(probe)
+            encoded = time.perf_counter()
+            matches = gallery.search(vector, k=1)
+            searched = time.perf_counter()
+
+            encode_times.append(encoded - start)
+            search_times.append(searched - encoded)
+            correct += bool(matches) and matches[0][0] == expected
+
+        return {
+            'build_seconds': round(build_seconds, 4),
+            'template_bytes': int(gallery.vectors[:, :gallery.size].nbytes // gallery.size),
+            'gallery_bytes': int(gallery.vectors[:, :gallery.size].nbytes),
+            'encode_ms_mean': round(1000 * float(np.mean(encode_times)), 3),
+            'search_ms_mean': round(1000 * float(np.mean(search_times)), 3),
+            'search_ms_p95': round(1000 * float(np.percentile(search_times, 95)), 3),
+            'rank1_accuracy': round(correct / len(probes), 4),
+        }
+
+    @staticmethod
+    def legacy_detect(service, gray):
+        """Previous behaviour: cascade on the full-resolution frame with a fixed 30px minimum"""
+        return service.face_cascade.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30), flags=cv2.CASCADE_SCALE_IMAGE)
+
+    def bench_detection(self, paths, repeat):
+        if not paths:
+            paths = [employee.profile_image.path
+                     for employee in Employee.objects.exclude(profile_image='').exclude(profile_image__isnull=True)]
+        if not paths:
+            raise CommandError('No images to benchmark; pass --images or upload employee profile images')
+
+        service = FaceRecognitionService()
+        images = []
+        for path in paths:
+            gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                raise CommandError(f'Could not read image {path}')
+
+            timings = {'full_resolution': [], 'configured': []}
+            for _ in range(repeat):
+                start = time.perf_counter()
+                legacy_faces = self.legacy_detect(service, gray)
+                timings['full_resolution'].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                faces = service.detect_faces_gray(gray)
+                timings['configured'].append(time.perf_counter() - start)
+
+            full_ms = 1000 * float(np.mean(timings['full_resolution']))
+            configured_ms = 1000 * float(np.mean(timings['configured']))
+            images.append({
+                'image': path,
+                'size': [int(gray.shape[1]), int(gray.shape[0])],
+                'full_resolution_ms': round(full_ms, 2),
+                'configured_ms': round(configured_ms, 2),
+                'speedup': round(full_ms / configured_ms, 1) if configured_ms else None,
+                'full_resolution_faces': len(legacy_faces),
+                'configured_faces': len(faces),
+                'first_face_iou': round(box_iou(legacy_faces[0], faces[0]), 3)
+                                  if len(legacy_faces) and len(faces) else None,
+            })
+
+        return {'config': service.detection_config(), 'images': images}
+
+    def bench_pipeline(self, options):
+        """
+        Per-stage timings of the recognition pipeline
+        Frame stages (decode, grayscale, detection, crop resize) are timed per
+        frame size, gallery stages (train, snapshot, DB load, predict) per
+        gallery size and backend. OpenCV is held to one thread so rates are
+        per core; PCA searches may still use several BLAS threads.
+        """
+        rng = np.random.default_rng(options['seed'])
+        samples = options['probes']
+        threads = cv2.getNumThreads()
+        cv2.setNumThreads(1)
+        try:
+            service = FaceRecognitionService()
+            frames = {}
+            for frame_size in options['frame_sizes']:
+                try:
+                    width, height = (int(side) for side in frame_size.lower().split('x'))
+                except ValueError:
+                    raise CommandError(f'Frame sizes look like 1280x720, got {frame_size}')
+                frames[frame_size] = self.bench_frame_stages(service, self.synthetic_frame(rng, width, height), samples)
+
+            galleries = {}
+            for size in options['sizes']:
+                if size < 2:
+                    raise CommandError('Gallery sizes must be at least 2')
+                labels, templates = self.synthetic_gallery(rng, size)
+                probe_labels, probes = self.make_probes(rng, labels, templates, samples)
+                galleries[str(size)] = {
+                    name: self.bench_gallery_stages(GALLERY_BACKENDS[name], labels, templates, probe_labels, probes)
+                    for name in options['backends']
+                }
+                if options['db']:
+                    galleries[str(size)]['db_load'] = self.bench_db_load(templates)
+                del templates
+        finally:
+            cv2.setNumThreads(threads)
+
+        return {
+            'cpu_count': os.cpu_count(),
+            'samples': samples,
+            'frames': frames,
+            'galleries': galleries,
+        }
+
+    def synthetic_frame(self, rng, width, height):
+        """JPEG camera frame of smooth noise with a synthetic crop in it, like a kiosk upload"""
+        frame = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 4)
+        _, (crop,) = self.synthetic_gallery(rng, 1)
+        side = max(24, min(width, height) // 3)
+        top, left = (height - side) // 2, (width - side) // 2
+        frame[top:top + side, left:left + side] = cv2.cvtColor(cv2.resize(crop, (side, side)), cv2.COLOR_GRAY2BGR)
+        return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+    @staticmethod
+    def bench_frame_stages(service, jpeg, samples):
+        data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()
+        timings = {stage: [] for stage in ('decode_base64', 'decode_bytes', 'grayscale', 'detect', 'resize')}
+        scans = []
+        for _ in range(samples):
+            image_bytes, base64_seconds = timed(lambda: base64.b64decode(data_url.split(';base64,')[1]))
+            gray, decode_seconds = timed(service.decode_image_bytes, image_bytes)
+            # BGR-to-gray conversion, as paid by detect_faces on colour frames
+            color = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            _, grayscale_seconds = timed(cv2.cvtColor, color, cv2.COLOR_BGR2GRAY)
+            faces, detect_seconds = timed(service.detect_faces_gray, gray)
+            # Crop the central square when the synthetic face is not detected
+            x, y, w, h = faces[0] if len(faces) else (gray.shape[1] // 3, gray.shape[0] // 3,
+                                                      gray.shape[1] // 3, gray.shape[0] // 3)
+            _, resize_seconds = timed(cv2.resize, gray[y:y+h, x:x+w], (100, 100))
+
+            timings['decode_base64'].append(base64_seconds)
+            timings['decode_bytes'].append(decode_seconds)
+            timings['grayscale'].append(grayscale_seconds)
+            timings['detect'].append(detect_seconds)
+            timings['resize'].append(resize_seconds)
+            scans.append(decode_seconds + detect_seconds + resize_seconds)
+
+        return {
+            'jpeg_bytes': len(jpeg),
+            'decoded_size': [int(gray.shape[1]), int(gray.shape[0])],
+            **{stage: latency_stats(seconds) for stage, seconds in timings.items()},
+            'bytes_to_crop': latency_stats(scans),
+        }
+
+    @staticmethod
+    def bench_gallery_stages(backend, labels, templates, probe_labels, probes):
+        digests = [0] * len(labels)
+        gallery, train_seconds = timed(
+            lambda: backend.build(labels, templates, digests, **FaceRecognitionService.gallery_options()))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'gallery.bin')
+            with open(path, 'wb') as snapshot_file:
+                _, save_seconds = timed(write_mapped_arrays, snapshot_file, gallery.to_arrays(), version='bench')
+            (_, arrays), map_seconds = timed(map_arrays, path)
+            attached, attach_seconds = timed(backend.attach, arrays)
+
+            encode_times = []
+            search_times = []
+            correct = 0
+            for expected, probe in zip(probe_labels, probes):
+                vector, encode_seconds = timed(attached.encode, probe)
+                matches, search_seconds = timed(attached.search, vector)
+                encode_times.append(encode_seconds)
+                search_times.append(search_seconds)
+                correct += bool(matches) and matches[0][0] == expected
+            del attached, arrays
+
+        return {
+            'train_seconds': round(train_seconds, 4),
+            'train_per_core_per_second': round(len(labels) / train_seconds, 1) if train_seconds else None,
+            'gallery_bytes': int(gallery.vectors[:, :gallery.size].nbytes),
+            'snapshot_save_ms': round(1000 * save_seconds, 3),
+            'snapshot_load_ms': round(1000 * (map_seconds + attach_seconds), 3),
+            'encode': latency_stats(encode_times),
+            'search': latency_stats(search_times),
+            'predict': latency_stats(np.add(encode_times, search_times)),
+            'rank1_accuracy': round(correct / len(probes), 4),
+        }
+
+    @staticmethod
+    def bench_db_load(templates):
+        """Time reading the templates back the way training does, then roll the rows back"""
+        today = datetime.date.today()
+        with transaction.atomic():
+            employees = []
+            for i, template in enumerate(templates):
+                employee = Employee(employee_id=f'BENCH-{i}', first_name='Bench', last_name=str(i),
+                                    email=f'bench-{i}@bench.invalid', hire_date=today)
+                employee.set_face_encoding(template)
+                employees.append(employee)
+            Employee.objects.bulk_create(employees, batch_size=1000)
+            del employees
+
+            start = time.perf_counter()
+            loaded = 0
+            queryset = FaceRecognitionService.gallery_queryset().filter(employee_id__startswith='BENCH-').only(
+                'id', 'face_template', 'face_template_shape', 'face_template_dtype')
+            for employee in queryset.iterator():
+                loaded += employee.get_face_encoding() is not None
+            load_seconds = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        return {
+            'employees': loaded,
+            'seconds': round(load_seconds, 4),
+            'per_core_per_second': round(loaded / load_seconds, 1) if load_seconds else None,
+        }
@@ -0,0 +1,104 @@
+import re
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from attendance.models import AttendanceRecord, AttendanceSummary, Employee, Site
+
+# Plan lines that read a whole table, per database vendor; the group is the table
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (\w+)\s*$'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+
+
+def full_scans(plan, pattern):
+    """Tables an EXPLAIN output reads in full"""
+    return sorted({match.group(1) for match in map(pattern.search, plan.splitlines()) if match})
+
+
+def hot_queries(employee_pk, site_code, today):
+    """
+    The queries run by scans, dashboards and consumers, with sample parameters
+    Counts and aggregates are explained as the plain query they wrap, without ordering
+    Returns: list of (name, queryset)
+    """
+    month_start = today.replace(day=1)
+    return [
+        # Scan path
+        ('presence: day state rebuild',
+         AttendanceRecord.objects.filter(employee__in=[employee_pk], date=today).order_by('timestamp')
+         .values_list('employee_id', 'attendance_type', 'timestamp')),
+        ('scan: summary lock',
+         AttendanceSummary.objects.filter(employee__in=[employee_pk], date=today)),
+        ('scan: 1:1 verification',
+         Employee.objects.filter(employee_id='E0001', is_active=True, face_template__isnull=False)),
+        ('summary repair: first check-in',
+         AttendanceRecord.objects.filter(employee=employee_pk, date=today, attendance_type='check_in')
+         .order_by('timestamp')[:1]),
+        # Recognition gallery
+        ('gallery: version',
+         Employee.objects.filter(face_template__isnull=False, is_active=True).values('updated_at')),
+        ('gallery: site shard',
+         Employee.sites.through.objects.filter(site__code=site_code).values_list('employee_id', flat=True)),
+        # Dashboards and consumers
+        ('dashboard: present today',
+         AttendanceSummary.objects.filter(date=today, is_present=True).values('pk').order_by()),
+        ('dashboard: hours today',
+         AttendanceSummary.objects.filter(date=today).values('total_hours').order_by()),
+        ('dashboard: records today',
+         AttendanceRecord.objects.filter(date=today).values('pk').order_by()),
+        ('dashboard: recent records',
+         AttendanceRecord.objects.select_related('employee').order_by('-timestamp')[:10]),
+        ('dashboard: recent summaries',
+         AttendanceSummary.objects.select_related('employee').order_by('-date')[:30]),
+        ('dashboard: employees without a face',
+         Employee.objects.filter(face_template__isnull=True).values('pk').order_by()),
+        ('employee: today summary',
+         AttendanceSummary.objects.filter(employee=employee_pk, date=today)[:1]),
+        ('employee: recent records',
+         AttendanceRecord.objects.filter(employee=employee_pk).order_by('-timestamp')[:10]),
+        ('employee: days present this month',
+         AttendanceSummary.objects.filter(employee=employee_pk, date__gte=month_start, is_present=True)
+         .values('pk').order_by()),
+        ('export: employee records',
+         AttendanceRecord.objects.filter(employee=employee_pk, date__gte=today - timedelta(days=31))
+         .order_by('date', 'timestamp')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the attendance hot queries and flag the ones that scan a whole table'
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        pattern = FULL_SCAN_PATTERNS.get(vendor)
+        if pattern is None:
+            self.stdout.write(self.style.WARNING(f'Full scans are not detected on {vendor}; showing the plans only'))
+
+        employee_pk = Employee.objects.values_list('pk', flat=True).first() or 1
+        site_code = Site.objects.values_list('code', flat=True).first() or 'main'
+        today = timezone.now().date()
+
+        flagged = 0
+        with transaction.atomic():
+            if vendor == 'postgresql':
+                # On small tables the planner rightly prefers a sequential scan; with it
+                # discouraged, a Seq Scan in the plan means no index can serve the query
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in hot_queries(employee_pk, site_code, today):
+                plan = queryset.explain()
+                scanned = full_scans(plan, pattern) if pattern else []
+                if scanned:
+                    flagged += 1
+                    self.stdout.write(self.style.ERROR(f'❌ {name}: full scan of {", ".join(scanned)}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'✅ {name}'))
+                if scanned or options['verbosity'] > 1 or pattern is None:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'    {line}')
+
+        if flagged:
+            raise CommandError(f'{flagged} queries scan a whole table')
@@ -1,8 +1,11 @@
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 from attendance.models import Employee
-from attendance.face_recognition_service import face_service
-import base64
+from attendance.enrollment import encode_profile_image, enroll_employees, rebuild_gallery
+from collections import Counter
 import os
+import time
+
 
 class Command(BaseCommand):
     help = 'Create face encodings for employees with profile images but no face encodings'
@@ -10,12 +13,16 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--employee-id', type=str, help='Specific employee ID to process')
         parser.add_argument('--all', action='store_true', help='Process all employees without face encodings')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes encoding images with --all; 1 encodes in this process (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Templates written per bulk update, and progress interval, with --all (default: 500)')
 
     def handle(self, *args, **options):
         if options['employee_id']:
             self.process_employee(options['employee_id'])
         elif options['all']:
-            self.process_all_employees()
+            self.process_all_employees(max(1, options['workers']), max(1, options['chunk_size']))
         else:
             self.stdout.write('Please specify --employee-id <ID> or --all')
 
@@ -26,32 +33,69 @@ class Command(BaseCommand):
         except Employee.DoesNotExist:
             self.stdout.write(self.style.ERROR(f'Employee {employee_id} not found'))
 
-    def process_all_employees(self):
-        employees = Employee.objects.filter(profile_image__isnull=False)
-        for employee in employees:
-            if not employee.face_encoding:
-                self.create_face_encoding(employee)
+    def process_all_employees(self, workers, chunk_size):
+        """
+        Bulk enrollment: encode every pending profile image across a process
+        pool, write the templates chunk by chunk with bulk_update, and rebuild
+        the gallery once at the end instead of re-enrolling per employee
+        """
+        employees = list(
+            Employee.objects.filter(Q(face_template__isnull=True) | Q(face_template=b''))
+            .exclude(profile_image='').exclude(profile_image__isnull=True)
+            .only('id', 'employee_id', 'first_name', 'last_name', 'profile_image')
+            .order_by('pk')
+        )
+        total = len(employees)
+        if not total:
+            self.stdout.write('No employees waiting for a face encoding')
+            return
+
+        self.stdout.write(f'Encoding {total} profile images with {workers} worker(s)...')
+        start = time.perf_counter()
+
+        def progress(done, total, encoded, failed):
+            rate = done / (time.perf_counter() - start)
+            self.stdout.write(f'{done}/{total} processed, {encoded} encoded, {failed} failed ({rate:.1f} images/s)')
+
+        enrolled, failures = enroll_employees(employees, workers, chunk_size, progress)
+
+        if enrolled:
+            # Templates were bulk-written without post_save, so live recognizers learn of them here
+            self.stdout.write('Rebuilding the recognition gallery...')
+            success, message = rebuild_gallery()
+            self.stdout.write(self.style.SUCCESS(message) if success else self.style.ERROR(message))
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(enrolled)} of {total} employees enrolled'))
+        self.report_failures(failures)
+
+    def report_failures(self, failures):
+        """Per-employee failure list, followed by a count per reason"""
+        if not failures:
+            return
+        self.stdout.write(self.style.ERROR(f'❌ {len(failures)} employees could not be enrolled:'))
+        for employee, message in failures:
+            self.stdout.write(f'  {employee.employee_id} - {employee.first_name} {employee.last_name}: {message}')
+        for message, count in Counter(message for _, message in failures).most_common():
+            self.stdout.write(self.style.WARNING(f'  {count} × {message}'))
 
     def create_face_encoding(self, employee):
         if not employee.profile_image:
             self.stdout.write(self.style.WARNING(f'No profile image for {employee.employee_id}'))
             return
 
+        self.stdout.write(f'Processing {employee.employee_id} - {employee.first_name} {employee.last_name}...')
         try:
-            # Read the existing image file
-            with open(employee.profile_image.path, 'rb') as img_file:
-                img_data = base64.b64encode(img_file.read()).decode()
-                image_base64 = f"data:image/jpeg;base64,{img_data}"
-                
-                self.stdout.write(f'Processing {employee.employee_id} - {employee.first_name} {employee.last_name}...')
-                
-                # Create face encoding
-                success, message = face_service.register_employee_face(employee, image_base64)
-                
-                if success:
-                    self.stdout.write(self.style.SUCCESS(f'✅ {employee.employee_id}: {message}'))
-                else:
-                    self.stdout.write(self.style.ERROR(f'❌ {employee.employee_id}: {message}'))
-                    
+            # Decode the file as is; no round trip through a base64 data URL
+            face_encoding, message = encode_profile_image(employee.profile_image.path)
+
+            if face_encoding is None:
+                self.stdout.write(self.style.ERROR(f'❌ {employee.employee_id}: {message}'))
+                return
+
+            # The post_save signal enrolls the template in live recognizers
+            employee.set_face_encoding(face_encoding)
+            employee.save()
+            self.stdout.write(self.style.SUCCESS(f'✅ {employee.employee_id}: Face registered successfully'))
+
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error processing {employee.employee_id}: {str(e)}'))
@@ -0,0 +1,121 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from attendance.employee_import import EmployeeImporter
+from attendance.import_jobs import write_status
+from collections import Counter
+import os
+import signal
+import sys
+import threading
+import time
+import zipfile
+
+
+class Command(BaseCommand):
+    help = 'Import employees from a CSV file and a ZIP of their photos, then enroll their faces'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='CSV with employee_id, first_name, last_name, email, hire_date '
+                                             'and optionally phone, department, position, is_active, sites, photo')
+        parser.add_argument('--photos', help='ZIP of photos named <employee_id>.jpg or as in the photo column')
+        parser.add_argument('--batch-size', type=int, default=500, help='Employees inserted per bulk insert (default: 500)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes encoding photos; 1 encodes in this process (default: CPU count)')
+        parser.add_argument('--job', help='Job directory of an admin import; the result is written to its status file '
+                                          'and the uploads are removed afterwards')
+
+    def handle(self, *args, **options):
+        self.inserting = self.stopping = False
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.terminate)
+        job_dir = options['job']
+        try:
+            importer, enrolled, failures = self.import_employees(options)
+        except Exception as e:
+            if job_dir:
+                write_status(job_dir, state='failed', message=str(e))
+            raise
+        finally:
+            if job_dir:
+                for path in (options['csv_file'], options['photos']):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+
+        self.report('rows skipped', importer.errors)
+        self.report('photo problems', importer.warnings)
+        self.report('faces not enrolled', [(None, employee.employee_id, message) for employee, message in failures])
+
+        if job_dir:
+            problems = [f'line {line} ({employee_id}): {message}' for line, employee_id, message in importer.errors + importer.warnings]
+            problems += [f'{employee.employee_id}: {message}' for employee, message in failures]
+            write_status(job_dir, state='done', created=len(importer.created), enrolled=len(enrolled), problems=problems)
+
+    def terminate(self, signum, frame):
+        """
+        SIGTERM: exit now, or once the current batch is inserted while rows are
+        being imported, so that no stored photo is left without its employee
+        """
+        if self.inserting:
+            self.stopping = True
+        else:
+            sys.exit(128 + signum)
+
+    def import_employees(self, options):
+        """
+        Import the CSV, then enroll the new employees' photos
+        Returns: (importer, enrolled employee pks, list of (employee, message) failures)
+        """
+        photos = None
+        if options['photos']:
+            try:
+                photos = zipfile.ZipFile(options['photos'])
+            except (OSError, zipfile.BadZipFile) as e:
+                raise CommandError(f"Cannot open photo archive: {e}")
+
+        importer = EmployeeImporter(photos, options['batch_size'])
+        start = time.perf_counter()
+
+        def import_progress(rows_read, created, skipped):
+            self.stdout.write(f'{rows_read} rows read, {created} employees created, {skipped} skipped')
+            if self.stopping:
+                sys.exit(128 + signal.SIGTERM)
+
+        self.inserting = True
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as csv_file:
+                importer.import_csv(csv_file, import_progress)
+        except OSError as e:
+            raise CommandError(f"Cannot read CSV: {e}")
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+        finally:
+            self.inserting = False
+            if photos is not None:
+                photos.close()
+        if self.stopping:
+            sys.exit(128 + signal.SIGTERM)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(importer.created)} employees imported in {time.perf_counter() - start:.1f}s'
+        ))
+
+        def enroll_progress(done, total, encoded, failed):
+            self.stdout.write(f'{done}/{total} photos processed, {encoded} encoded, {failed} failed')
+
+        enrolled, failures, gallery_message = importer.enroll(options['workers'], options['batch_size'], enroll_progress)
+
+        if gallery_message:
+            self.stdout.write(gallery_message)
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(enrolled)} faces enrolled in {time.perf_counter() - start:.1f}s'))
+        return importer, enrolled, failures
+
+    def report(self, title, problems):
+        """One line per problem, followed by a count per reason"""
+        if not problems:
+            return
+        self.stdout.write(self.style.ERROR(f'❌ {len(problems)} {title}:'))
+        for line, employee_id, message in problems:
+            where = f'line {line}, ' if line else ''
+            self.stdout.write(f'  {where}{employee_id or "(no employee_id)"}: {message}')
+        for message, count in Counter(message for _, _, message in problems).most_common():
+            self.stdout.write(self.style.WARNING(f'  {count} × {message}'))
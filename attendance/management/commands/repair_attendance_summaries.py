@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendance.models import AttendanceRecord, AttendanceSummary, Employee
+from attendance.web_views import attendance_summary_values, update_attendance_summary_local
+
+
+class Command(BaseCommand):
+    help = 'Recompute attendance summaries from the attendance records and fix the ones that differ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=str, help='Last day to check, YYYY-MM-DD (default: today)')
+        parser.add_argument('--days', type=int, default=1, help='Number of days to check, ending at --date (default: 1)')
+        parser.add_argument('--employee-id', type=str, help='Only check this employee')
+        parser.add_argument('--dry-run', action='store_true', help='Report the summaries that differ without fixing them')
+
+    def handle(self, *args, **options):
+        try:
+            end = date.fromisoformat(options['date']) if options['date'] else timezone.now().date()
+        except ValueError:
+            raise CommandError(f"Invalid date: {options['date']}")
+        start = end - timedelta(days=max(1, options['days']) - 1)
+
+        days = AttendanceRecord.objects.filter(date__range=(start, end))
+        if options['employee_id']:
+            days = days.filter(employee__employee_id=options['employee_id'])
+        days = list(days.values_list('employee_id', 'date').distinct().order_by('date', 'employee_id'))
+
+        employees = Employee.objects.in_bulk({employee_pk for employee_pk, _ in days})
+        summaries = {
+            (summary.employee_id, summary.date): summary
+            for summary in AttendanceSummary.objects.filter(date__range=(start, end), employee__in=employees)
+        }
+
+        checked = repaired = 0
+        for employee_pk, day in days:
+            checked += 1
+            employee = employees[employee_pk]
+            values = attendance_summary_values(employee, day)
+            summary = summaries.get((employee_pk, day))
+            differences = self.differences(summary, values)
+            if not differences:
+                continue
+
+            repaired += 1
+            self.stdout.write(self.style.WARNING(f'{employee.employee_id} {day}: {", ".join(differences)}'))
+            if not options['dry_run']:
+                update_attendance_summary_local(employee, day)
+
+        verb = 'would be repaired' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'✅ {checked} summaries checked, {repaired} {verb}'))
+
+    @staticmethod
+    def differences(summary, values):
+        """Fields whose stored value differs from the recomputed one"""
+        if summary is None:
+            return ['missing']
+        differences = []
+        for field, value in values.items():
+            stored = getattr(summary, field)
+            if field == 'total_hours':
+                stored, value = Decimal(stored).quantize(Decimal('0.01')), Decimal(value).quantize(Decimal('0.01'))
+            if stored != value:
+                differences.append(f'{field} {stored} != {value}')
+        return differences
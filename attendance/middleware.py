@@ -2,7 +2,9 @@ from django.http import HttpResponse, JsonResponse
 from django.urls import resolve, reverse
 from django.utils.deprecation import MiddlewareMixin
 from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
 import json
+from .timing import collect_timings, log_timings, server_timing_header, timings_enabled
 
 class MaintenanceModeMiddleware(MiddlewareMixin):    
     def process_request(self, request):
@@ -32,3 +34,26 @@ class MaintenanceModeMiddleware(MiddlewareMixin):
             return HttpResponse(html, status=503, content_type='text/html')
             
         return None
+
+
+class ServerTimingMiddleware:
+    """
+    Report where a scan's time went: every stage timed during the request
+    (decode, detection, matching, attendance writes, broadcasts, ...) is sent
+    back in a Server-Timing header and logged with one field per stage.
+    Removed from the stack when ATTENDANCE_SCAN_TIMINGS is off.
+    """
+    
+    def __init__(self, get_response):
+        if not timings_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        with collect_timings() as timings:
+            response = self.get_response(request)
+        
+        if timings:
+            response['Server-Timing'] = server_timing_header(timings)
+            log_timings(timings, path=request.path, status=response.status_code)
+        return response
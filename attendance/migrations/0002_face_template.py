@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:49
+
+import json
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def convert_json_to_template(apps, schema_editor):
+    """Convert JSON face encodings into raw uint8 template bytes"""
+    import numpy as np
+
+    Employee = apps.get_model('attendance', 'Employee')
+    employees = Employee.objects.exclude(face_encoding__isnull=True).exclude(face_encoding='')
+
+    batch = []
+    for employee in employees.only('id', 'face_encoding').iterator(chunk_size=BATCH_SIZE):
+        template = np.array(json.loads(employee.face_encoding), dtype=np.uint8)
+        employee.face_template = template.tobytes()
+        employee.face_template_shape = ','.join(str(dim) for dim in template.shape)
+        employee.face_template_dtype = template.dtype.name
+        batch.append(employee)
+
+        if len(batch) >= BATCH_SIZE:
+            Employee.objects.bulk_update(batch, ['face_template', 'face_template_shape', 'face_template_dtype'])
+            batch = []
+
+    if batch:
+        Employee.objects.bulk_update(batch, ['face_template', 'face_template_shape', 'face_template_dtype'])
+
+
+def convert_template_to_json(apps, schema_editor):
+    """Convert raw template bytes back into JSON face encodings"""
+    import numpy as np
+
+    Employee = apps.get_model('attendance', 'Employee')
+    employees = Employee.objects.filter(face_template__isnull=False)
+
+    batch = []
+    for employee in employees.only('id', 'face_template', 'face_template_shape', 'face_template_dtype').iterator(chunk_size=BATCH_SIZE):
+        shape = tuple(int(dim) for dim in employee.face_template_shape.split(','))
+        template = np.frombuffer(employee.face_template, dtype=employee.face_template_dtype).reshape(shape)
+        employee.face_encoding = json.dumps(template.tolist())
+        batch.append(employee)
+
+        if len(batch) >= BATCH_SIZE:
+            Employee.objects.bulk_update(batch, ['face_encoding'])
+            batch = []
+
+    if batch:
+        Employee.objects.bulk_update(batch, ['face_encoding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='face_template',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='face_template_dtype',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='face_template_shape',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.RunPython(convert_json_to_template, convert_template_to_json),
+        migrations.RemoveField(
+            model_name='employee',
+            name='face_encoding',
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:42
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+
+# Scans insert records and update summaries all day; on PostgreSQL these indexes are built
+# and dropped CONCURRENTLY so scans are not blocked meanwhile. Other databases run the
+# plain operations. CONCURRENTLY cannot run in a transaction, hence atomic = False below.
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex that does not block writes on PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AlterForeignKeyIndexConcurrently(migrations.AlterField):
+    """AlterField that only toggles a foreign key's db_index, dropping or creating the index without blocking writes on PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            # The migration is not atomic; SQLite rebuilds the table here, so keep that in one transaction
+            with transaction.atomic(using=schema_editor.connection.alias):
+                return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        self._toggle_index(app_label, schema_editor, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            with transaction.atomic(using=schema_editor.connection.alias):
+                return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        self._toggle_index(app_label, schema_editor, to_state)
+
+    def _toggle_index(self, app_label, schema_editor, state):
+        """Give the column a single-column index exactly when the field in state has db_index"""
+        model = state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        field = model._meta.get_field(self.name)
+        existing = schema_editor._constraint_names(model, [field.column], index=True, type_=models.Index.suffix)
+        if field.db_index and not existing:
+            schema_editor.execute(schema_editor._create_index_sql(model, fields=[field], concurrently=True))
+        elif not field.db_index:
+            for name in existing:
+                schema_editor.execute(schema_editor._delete_index_sql(model, name, concurrently=True))
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('attendance', '0003_sites'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='attendancerecord',
+            index=models.Index(fields=['employee', 'date', 'attendance_type', 'timestamp'], name='att_rec_emp_date_type_ts'),
+        ),
+        AddIndexConcurrently(
+            model_name='attendancerecord',
+            index=models.Index(fields=['employee', 'timestamp'], name='att_rec_emp_ts'),
+        ),
+        AddIndexConcurrently(
+            model_name='attendancerecord',
+            index=models.Index(fields=['date'], name='att_rec_date'),
+        ),
+        AddIndexConcurrently(
+            model_name='attendancerecord',
+            index=models.Index(fields=['timestamp'], name='att_rec_ts'),
+        ),
+        AddIndexConcurrently(
+            model_name='attendancesummary',
+            index=models.Index(fields=['date', 'is_present'], name='att_sum_date_present'),
+        ),
+        AddIndexConcurrently(
+            model_name='employee',
+            index=models.Index(condition=models.Q(('face_template__isnull', False)), fields=['is_active', 'updated_at'], name='employee_gallery_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='employee',
+            index=models.Index(condition=models.Q(('face_template__isnull', True)), fields=['id'], name='employee_no_face_idx'),
+        ),
+        # Dropped once the composite indexes leading with employee exist
+        AlterForeignKeyIndexConcurrently(
+            model_name='attendancerecord',
+            name='employee',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_records', to='attendance.employee'),
+        ),
+    ]
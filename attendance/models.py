@@ -1,6 +1,19 @@
 from django.db import models
 from django.contrib.auth.models import User
-import json
+
+
+class Site(models.Model):
+    code = models.SlugField(max_length=50, unique=True)  # Sent by kiosks to pick their gallery shard
+    name = models.CharField(max_length=100)
+    address = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'sites'
+        ordering = ['name']
 
 
 class Employee(models.Model):
@@ -13,7 +26,10 @@ class Employee(models.Model):
     position = models.CharField(max_length=100, blank=True)
     hire_date = models.DateField()
     is_active = models.BooleanField(default=True)
-    face_encoding = models.TextField(blank=True, null=True)  # Store face encoding as JSON
+    sites = models.ManyToManyField(Site, blank=True, related_name='employees')
+    face_template = models.BinaryField(blank=True, null=True)  # Raw face template bytes
+    face_template_shape = models.CharField(max_length=20, blank=True)  # e.g. "100,100"
+    face_template_dtype = models.CharField(max_length=10, blank=True)  # e.g. "uint8"
     profile_image = models.ImageField(upload_to='employee_photos/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -22,19 +38,31 @@ class Employee(models.Model):
         return f"{self.employee_id} - {self.first_name} {self.last_name}"
 
     def set_face_encoding(self, encoding_array):
-        """Convert numpy array to JSON string for storage"""
+        """Store numpy array as raw uint8 bytes plus its shape and dtype"""
         if encoding_array is not None:
-            self.face_encoding = json.dumps(encoding_array.tolist())
+            import numpy as np
+            template = np.ascontiguousarray(encoding_array, dtype=np.uint8)
+            self.face_template = template.tobytes()
+            self.face_template_shape = ','.join(str(dim) for dim in template.shape)
+            self.face_template_dtype = template.dtype.name
 
     def get_face_encoding(self):
-        """Convert JSON string back to numpy array"""
-        if self.face_encoding:
+        """Return the stored template as a read-only numpy view over the raw bytes"""
+        if self.face_template:
             import numpy as np
-            return np.array(json.loads(self.face_encoding))
+            shape = tuple(int(dim) for dim in self.face_template_shape.split(','))
+            return np.frombuffer(self.face_template, dtype=self.face_template_dtype).reshape(shape)
         return None
 
     class Meta:
         db_table = 'employees'
+        indexes = [
+            # Gallery loads and the gallery_version() fingerprint (count, max updated_at) read this index only
+            models.Index(fields=['is_active', 'updated_at'], condition=models.Q(face_template__isnull=False),
+                         name='employee_gallery_idx'),
+            # Employees still waiting for enrollment
+            models.Index(fields=['id'], condition=models.Q(face_template__isnull=True), name='employee_no_face_idx'),
+        ]
 
 
 class AttendanceRecord(models.Model):
@@ -43,7 +71,8 @@ class AttendanceRecord(models.Model):
         ('check_out', 'Check Out'),
     ]
 
-    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_records')
+    # No single-column index: the composite indexes below lead with employee
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_records', db_index=False)
     attendance_type = models.CharField(max_length=10, choices=ATTENDANCE_TYPES)
     timestamp = models.DateTimeField(auto_now_add=True)
     date = models.DateField(auto_now_add=True)
@@ -58,6 +87,16 @@ class AttendanceRecord(models.Model):
     class Meta:
         db_table = 'attendance_records'
         ordering = ['-timestamp']
+        indexes = [
+            # An employee's records of a day by type in time order: day state rebuilds, summary recompute
+            models.Index(fields=['employee', 'date', 'attendance_type', 'timestamp'], name='att_rec_emp_date_type_ts'),
+            # An employee's latest records (dashboards, exports)
+            models.Index(fields=['employee', 'timestamp'], name='att_rec_emp_ts'),
+            # Records of a day across employees
+            models.Index(fields=['date'], name='att_rec_date'),
+            # Latest records across employees
+            models.Index(fields=['timestamp'], name='att_rec_ts'),
+        ]
 
 
 class AttendanceSummary(models.Model):
@@ -77,3 +116,7 @@ class AttendanceSummary(models.Model):
         db_table = 'attendance_summary'
         unique_together = ['employee', 'date']
         ordering = ['-date']
+        indexes = [
+            # Who is present on a day; unique_together already covers (employee, date)
+            models.Index(fields=['date', 'is_present'], name='att_sum_date_present'),
+        ]
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.core.cache import caches
+
+# Seconds a state is kept; a state from an earlier date is rebuilt, so this only bounds memory
+PRESENCE_TIMEOUT = 2 * 24 * 3600
+
+
+def presence_cache():
+    return caches[getattr(settings, 'ATTENDANCE_PRESENCE_CACHE', 'default')]
+
+
+def presence_key(employee_pk):
+    return f'attendance:presence:{employee_pk}'
+
+
+def empty_state(date):
+    return {'date': date, 'last_action': None, 'last_timestamp': None, 'first_check_in': None}
+
+
+def next_attendance_action(state):
+    """Check out after a check-in, otherwise check in (first scan of the day, or back after a check-out)"""
+    return 'check_out' if state['last_action'] == 'check_in' else 'check_in'
+
+
+def apply_record(state, attendance_record):
+    """Today's state after a new record, as a new dict"""
+    state = {
+        **state,
+        'last_action': attendance_record.attendance_type,
+        'last_timestamp': attendance_record.timestamp,
+    }
+    if attendance_record.attendance_type == 'check_in' and state['first_check_in'] is None:
+        state['first_check_in'] = attendance_record.timestamp
+    return state
+
+
+def load_states(employee_pks, date):
+    """Today's states of the employees, built from their records in one query"""
+    from .models import AttendanceRecord
+
+    states = {employee_pk: empty_state(date) for employee_pk in employee_pks}
+    records = AttendanceRecord.objects.filter(
+        employee__in=employee_pks, date=date
+    ).order_by('timestamp').values_list('employee_id', 'attendance_type', 'timestamp')
+    for employee_pk, attendance_type, timestamp in records:
+        state = states[employee_pk]
+        state['last_action'], state['last_timestamp'] = attendance_type, timestamp
+        if attendance_type == 'check_in' and state['first_check_in'] is None:
+            state['first_check_in'] = timestamp
+    return states
+
+
+def today_states(employee_pks, date):
+    """
+    Each employee's presence for the day: last action and its time, and first check-in
+    Read from the shared cache, so deciding between check-in and check-out
+    costs no query at peak; employees missing from the cache, or cached for
+    an earlier date, are rebuilt from the DB in one query and cached again.
+    Returns: dict of employee pk -> state
+    """
+    employee_pks = list(employee_pks)
+    cache = presence_cache()
+    keys = {presence_key(employee_pk): employee_pk for employee_pk in employee_pks}
+    try:
+        cached = cache.get_many(keys)
+    except Exception:
+        cached = {}
+
+    states = {}
+    for key, state in cached.items():
+        if state.get('date') == date:
+            states[keys[key]] = state
+
+    missing = [employee_pk for employee_pk in employee_pks if employee_pk not in states]
+    if missing:
+        loaded = load_states(missing, date)
+        states.update(loaded)
+        remember_states(loaded)
+    return states
+
+
+def remember_states(states):
+    """Cache employees' states; call after their records are written, before the transaction commits"""
+    if not states:
+        return
+    try:
+        presence_cache().set_many(
+            {presence_key(employee_pk): state for employee_pk, state in states.items()}, timeout=PRESENCE_TIMEOUT
+        )
+    except Exception:
+        pass
+
+
+def forget_states(employee_pks):
+    """Drop cached states so they are rebuilt from the DB, e.g. when records change outside the scan path"""
+    try:
+        presence_cache().delete_many([presence_key(employee_pk) for employee_pk in employee_pks])
+    except Exception:
+        pass
@@ -0,0 +1,466 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from .timing import collect_timings, record_timings, timings_enabled
+from .worker_processes import spawn_context
+
+# Workers are spawned (see worker_processes), so models and the recognition service are
+# only imported inside functions.
+
+
+class RecognitionBusy(Exception):
+    """Raised when the recognition queue is full"""
+
+
+# Pool tuning; any key can be overridden with settings.FACE_RECOGNITION_POOL
+POOL_DEFAULTS = {
+    'WORKERS': 0,  # Worker processes; 0 runs recognition inline in the request thread
+    'MAX_QUEUE': 32,  # Scans queued or running before new ones are turned away
+    'TIMEOUT': 10,  # Seconds a request waits for its result
+    'MAX_TASKS_PER_WORKER': 500,  # Workers are replaced after about this many scans each; 0 never
+}
+
+
+def pool_config():
+    """Pool parameters: POOL_DEFAULTS updated with settings.FACE_RECOGNITION_POOL"""
+    return {**POOL_DEFAULTS, **getattr(settings, 'FACE_RECOGNITION_POOL', {})}
+
+
+# Set in pool workers, which warm themselves and must never start a pool of their own
+_in_worker = False
+_worker_warm_up = None  # (ready, message) of the worker's start-up load
+
+
+def _init_worker(started):
+    """Worker start-up: report the worker's pid, set up Django and warm the cascade and gallery once"""
+    global _in_worker, _worker_warm_up
+    _in_worker = True
+    started.put(os.getpid())
+
+    import django
+    django.setup()
+
+    _worker_warm_up = _warm_gallery()
+
+
+def _warm_gallery():
+    """
+    Load this process's cascade and gallery
+    Returns: (ready, message); ready with nothing to load when no employee has a template yet
+    """
+    from .face_recognition_service import face_service
+    try:
+        face_service.thread_cascade()
+        success, message = face_service.ensure_trained()
+        if not success and not face_service.gallery_queryset().exists():
+            return True, message
+        return success, message
+    except Exception as e:
+        return False, f"Warm-up failed: {str(e)}"
+
+
+def _worker_service():
+    """The worker's service; match_faces brings its gallery up to date, so it is not refreshed here"""
+    from django.db import close_old_connections
+    from .face_recognition_service import face_service
+
+    close_old_connections()
+    return face_service
+
+
+def _timed_task(task, *args):
+    """Run a task in the worker and send its stage timings back with the result"""
+    if not timings_enabled():
+        return task(*args), {}
+    with collect_timings() as timings:
+        result = task(*args)
+    return result, timings
+
+
+def _warm_task():
+    """The worker's start-up load result, retried while it failed"""
+    global _worker_warm_up
+    if not _worker_warm_up[0]:
+        _worker_warm_up = _warm_gallery()
+    return _worker_warm_up
+
+
+def _recognize_batch_task(images, confidence_threshold, site):
+    try:
+        return _worker_service().recognize_faces(images, confidence_threshold, site=site)
+    except Exception as e:
+        return [(None, 0.0, f"Error during face recognition: {str(e)}")] * len(images)
+
+
+def _match_task(crops, confidence_threshold, site):
+    try:
+        return _worker_service().match_faces(crops, confidence_threshold, site=site)
+    except Exception as e:
+        return [(None, 0.0, f"Error during face recognition: {str(e)}")] * len(crops)
+
+
+def _verify_task(employee_id, image, confidence_threshold):
+    from django.db import close_old_connections
+    from .face_recognition_service import face_service
+
+    # 1:1 verification reads one template from the DB, the gallery is not needed
+    close_old_connections()
+    employee, confidence_score, message = face_service.verify_face(employee_id, image, confidence_threshold)
+    return (employee.pk if employee else None), confidence_score, message
+
+
+class RecognitionPool:
+    """
+    Process pool running CPU-bound recognition off the request thread
+    Decode, detection and matching hold the GIL for most of a scan, so each
+    worker process keeps its own warm cascade and gallery and throughput
+    scales with cores. At most MAX_QUEUE scans are queued or running; the
+    rest are turned away at once instead of piling up behind the rush.
+
+    Once the workers have run MAX_TASKS_PER_WORKER scans each, a replacement
+    pool is started and warmed alongside, then swapped in while the old one
+    finishes its queue. (ProcessPoolExecutor's own max_tasks_per_child can
+    deadlock on Python 3.11.) A scan still running when its caller times out
+    cannot be cancelled, so the pool is replaced at once and workers of the
+    old one still busy after another timeout are killed. Workers report their
+    pid when they start, so they can be found among this process's children
+    without reaching into the executor.
+    """
+
+    def __init__(self, workers, max_queue, timeout, max_tasks_per_worker):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.slots = threading.BoundedSemaphore(max_queue)
+        self._executor_lock = threading.Lock()
+        self._started = {}  # executor -> queue its workers put their pid on
+        self.executor, self.warming = self._start_executor()
+        self.tasks = 0  # Scans submitted to the current executor
+        self._replacing = False
+
+    def _start_executor(self):
+        context = spawn_context()
+        started = context.SimpleQueue()
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(started,), mp_context=context
+        )
+        self._started[executor] = started
+        # Workers are spawned on demand; one task each starts and warms them all now
+        warmed = [executor.submit(_warm_task) for _ in range(self.workers)]
+        return executor, warmed
+
+    def _worker_pids(self, executor):
+        """Pids of the workers an executor has started; forgets the executor, call once it is retired"""
+        started = self._started.pop(executor, None)
+        if started is None:
+            return set()
+        pids = set()
+        while not started.empty():
+            pids.add(started.get())
+        started.close()
+        return pids
+
+    def is_warm(self):
+        """Whether every worker of the current executor has loaded its cascade and gallery"""
+        return all(future.done() and not future.cancelled() and future.exception() is None and future.result()[0]
+                   for future in self.warming)
+
+    def warm_up_error(self):
+        """
+        Why a worker of the current executor failed to warm up, None while they are warming or warm
+        A failed warm-up is retried, so the next call reports on the new attempt.
+        """
+        warming = self.warming
+        if not all(future.done() for future in warming):
+            return None
+        errors = [str(future.exception()) if future.exception() is not None else future.result()[1]
+                  for future in warming if future.exception() is not None or not future.result()[0]]
+        if not errors:
+            return None
+        with self._executor_lock:
+            if self.warming is not warming:
+                return errors[0]
+            executor = self.executor
+            try:
+                self.warming = [executor.submit(_warm_task) for _ in range(self.workers)]
+                return errors[0]
+            except BrokenProcessPool:
+                pass
+        self._restart(executor)
+        return errors[0]
+
+    def run(self, task, *args):
+        """
+        Run a task in a worker and wait for its result
+        Raises: RecognitionBusy when the queue is full, concurrent.futures.TimeoutError
+        when the result takes longer than the timeout
+        """
+        if not self.slots.acquire(blocking=False):
+            raise RecognitionBusy("Recognition queue is full")
+
+        executor = self.executor
+        try:
+            future = executor.submit(task, *args)
+        except Exception as e:
+            self.slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._restart(executor)
+            raise
+        # The slot stays taken until the worker is done, even if the caller gave up
+        future.add_done_callback(lambda _: self.slots.release())
+        self._count_task()
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if not future.cancel():
+                # Already running: its worker may be stuck on this frame for good
+                self._replace_stuck(executor)
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next scans
+            self._restart(executor)
+            raise
+
+    def _count_task(self):
+        with self._executor_lock:
+            self.tasks += 1
+            if (not self.max_tasks_per_worker or self._replacing
+                    or self.tasks < self.workers * self.max_tasks_per_worker):
+                return
+            self._replacing = True
+        threading.Thread(target=self._recycle, daemon=True).start()
+
+    def _recycle(self):
+        """Swap in a freshly warmed pool; the old one drains and exits"""
+        replacement, warmed = self._start_executor()
+        wait(warmed)
+        with self._executor_lock:
+            old, self.executor, self.warming = self.executor, replacement, warmed
+            self.tasks = 0
+            self._replacing = False
+        old.shutdown(wait=False)
+        self._worker_pids(old)
+
+    def _restart(self, broken_executor):
+        with self._executor_lock:
+            if self.executor is not broken_executor:
+                return
+            self.executor, self.warming = self._start_executor()
+            self.tasks = 0
+        broken_executor.shutdown(wait=False, cancel_futures=True)
+        self._worker_pids(broken_executor)
+
+    def _replace_stuck(self, stuck_executor):
+        """Swap in a fresh pool now; the old one finishes its queue and its workers still busy after the timeout are killed"""
+        with self._executor_lock:
+            if self.executor is not stuck_executor:
+                return
+            self.executor, self.warming = self._start_executor()
+            self.tasks = 0
+        stuck_executor.shutdown(wait=False)
+        timer = threading.Timer(self.timeout, self._kill_busy, args=(self._worker_pids(stuck_executor),))
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _kill_busy(pids):
+        """Terminate the workers still running; only live children match, so a reused pid is never hit"""
+        for process in multiprocessing.active_children():
+            if process.pid in pids:
+                process.terminate()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._worker_pids(self.executor)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    This process's recognition pool, started on first use
+    Returns: RecognitionPool, or None when settings disable the pool
+    """
+    global _pool
+    if _pool is None:
+        config = pool_config()
+        if not config['WORKERS']:
+            return None
+        with _pool_lock:
+            if _pool is None:
+                _pool = RecognitionPool(
+                    config['WORKERS'], config['MAX_QUEUE'], config['TIMEOUT'], config['MAX_TASKS_PER_WORKER']
+                )
+    return _pool
+
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+_warm_up_done = threading.Event()
+_warm_up_result = None  # (ready, message) of the last inline warm-up
+
+
+def warm_up():
+    """
+    Load the cascade and gallery now rather than on the first scan: start
+    the pool and wait for its workers, or warm this process when recognition
+    runs inline
+    A failed inline warm-up lets start_warm_up() run it again.
+    """
+    global _warm_up_result, _warm_up_thread
+    try:
+        pool = get_pool()
+        if pool is None:
+            _warm_up_result = _warm_gallery()
+        else:
+            wait(pool.warming)
+    except Exception as e:
+        _warm_up_result = False, f"Warm-up failed: {str(e)}"
+    finally:
+        if _warm_up_result is not None and not _warm_up_result[0]:
+            with _warm_up_lock:
+                _warm_up_thread = None
+        _warm_up_done.set()
+
+
+def start_warm_up():
+    """Run warm_up() once in a background thread; pool workers warm themselves instead"""
+    global _warm_up_thread
+    if _in_worker:
+        return
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            # Not a daemon: interpreter shutdown waits for it, since a thread torn
+            # down inside OpenCV while loading the cascade aborts the process
+            _warm_up_thread = threading.Thread(target=warm_up, name='recognition-warm-up')
+            _warm_up_thread.start()
+
+
+def readiness():
+    """
+    Whether this process can serve scans without a cold start; starts the warm-up if it has not run
+    Returns: (ready, details) where details describes the pool or the inline gallery
+    """
+    start_warm_up()
+    if pool_config()['WORKERS']:
+        pool = _pool
+        warm = pool is not None and pool.is_warm()
+        details = {'pool_workers': pool.workers if pool else 0, 'workers_warm': warm}
+        error = pool.warm_up_error() if pool is not None and not warm else None
+        if error:
+            details['error'] = error
+        return warm, details
+
+    from .face_recognition_service import face_service
+    loaded = face_service.is_built and face_service.is_trained
+    details = {'gallery_loaded': loaded, 'employees': len(face_service.gallery) if loaded else 0}
+    if loaded:
+        return True, details
+    if not _warm_up_done.is_set() or _warm_up_result is None:
+        return False, details
+    # An empty gallery cannot load, but the process is as warm as it gets; a failed load is not ready
+    ready, message = _warm_up_result
+    if not ready:
+        details['error'] = message
+    return ready, details
+
+
+def _run_in_pool(pool, task, *args):
+    """
+    Run a recognition task in the pool
+    Returns: (result, None), or (None, message) when the scan could not be run
+    """
+    start = time.perf_counter()
+    try:
+        result, worker_timings = pool.run(_timed_task, task, *args)
+    except RecognitionBusy:
+        return None, "Recognition is busy, please try again"
+    except FutureTimeoutError:
+        return None, "Recognition timed out, please try again"
+    except BrokenProcessPool:
+        return None, "Recognition worker stopped unexpectedly, please try again"
+
+    # Worker stages as measured in the worker; "pool" is the queueing and transfer around them
+    record_timings(worker_timings)
+    record_timings({'pool': time.perf_counter() - start - sum(worker_timings.values())})
+    return result, None
+
+
+def _with_employees(results):
+    """Swap the employee pks in (employee_pk, confidence_score, message) results for Employees"""
+    from .models import Employee
+
+    employees = Employee.objects.in_bulk({employee_pk for employee_pk, _, _ in results if employee_pk is not None})
+    resolved = []
+    for employee_pk, confidence_score, message in results:
+        if employee_pk is not None and employee_pk not in employees:
+            message = "Face not recognized"
+        resolved.append((employees.get(employee_pk), confidence_score, message))
+    return resolved
+
+
+def recognize_face(image, confidence_threshold=50, site=None):
+    """
+    recognize_faces for a single image
+    The employee is not loaded, so a scan can be debounced on the pk first.
+    Returns: (employee_pk, confidence_score, message)
+    """
+    return recognize_faces([image], confidence_threshold, site)[0]
+
+
+def recognize_faces(images, confidence_threshold=50, site=None):
+    """
+    FaceRecognitionService.recognize_faces in one pool worker, or inline when the pool is disabled
+    Returns: list of (employee_pk, confidence_score, message), one per image
+    """
+    pool = get_pool()
+    if pool is None:
+        from .face_recognition_service import face_service
+        try:
+            results = face_service.recognize_faces(images, confidence_threshold, site=site)
+        except Exception as e:
+            return [(None, 0.0, f"Error during face recognition: {str(e)}")] * len(images)
+    else:
+        results, error = _run_in_pool(pool, _recognize_batch_task, images, confidence_threshold, site)
+        if error:
+            return [(None, 0.0, error)] * len(images)
+    return results
+
+
+def match_faces(crops, confidence_threshold=50, site=None):
+    """
+    FaceRecognitionService.match_faces in one pool worker, or inline when the pool is disabled
+    Returns: list of (employee_pk, confidence_score, message), one per crop
+    """
+    pool = get_pool()
+    if pool is None:
+        from .face_recognition_service import face_service
+        try:
+            results = face_service.match_faces(crops, confidence_threshold, site=site)
+        except Exception as e:
+            return [(None, 0.0, f"Error during face recognition: {str(e)}")] * len(crops)
+    else:
+        results, error = _run_in_pool(pool, _match_task, crops, confidence_threshold, site)
+        if error:
+            return [(None, 0.0, error)] * len(crops)
+    return results
+
+
+def verify_face(employee_id, image, confidence_threshold=50):
+    """FaceRecognitionService.verify_face in a pool worker, or inline when the pool is disabled"""
+    pool = get_pool()
+    if pool is None:
+        from .face_recognition_service import face_service
+        return face_service.verify_face(employee_id, image, confidence_threshold)
+
+    result, error = _run_in_pool(pool, _verify_task, employee_id, image, confidence_threshold)
+    if error:
+        return None, 0.0, error
+    return _with_employees([result])[0]
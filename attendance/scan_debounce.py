@@ -0,0 +1,75 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+# Cache value while the scan that opened an employee's window is still being written
+PENDING = 'pending'
+
+# Seconds a scan waits for a concurrent scan of the same employee to finish writing
+PENDING_WAIT_SECONDS = 1.0
+PENDING_POLL_SECONDS = 0.05
+
+
+def debounce_window():
+    """Seconds after a recorded scan during which the employee's scans are not recorded again; 0 disables"""
+    return getattr(settings, 'ATTENDANCE_DEBOUNCE_SECONDS', 0)
+
+
+def debounce_cache():
+    return caches[getattr(settings, 'ATTENDANCE_DEBOUNCE_CACHE', 'default')]
+
+
+def scan_key(employee_pk):
+    return f'attendance:scan:{employee_pk}'
+
+
+def claim_scan(employee_pk):
+    """
+    Open the employee's debounce window, unless a recent scan already has
+    The window is taken with cache.add, which only one caller can win, so
+    concurrent workers scanning the same person never both write a record.
+    Returns: (True, None) when the caller should record the scan, or
+    (False, result) with the result of the scan that holds the window; result
+    is None when that scan is still being written after PENDING_WAIT_SECONDS
+    """
+    window = debounce_window()
+    if not window:
+        return True, None
+
+    cache = debounce_cache()
+    key = scan_key(employee_pk)
+    deadline = time.monotonic() + PENDING_WAIT_SECONDS
+    try:
+        while True:
+            if cache.add(key, PENDING, timeout=window):
+                return True, None
+            previous = cache.get(key)
+            if previous is not None and previous != PENDING:
+                return False, previous
+            if time.monotonic() >= deadline:
+                return False, None
+            time.sleep(PENDING_POLL_SECONDS)
+    except Exception:
+        # Cache unreachable: record the scan rather than lose it
+        return True, None
+
+
+def remember_scan(employee_pk, result):
+    """Keep a recorded scan's result for the rest of the window; later scans get it back"""
+    window = debounce_window()
+    if not window:
+        return
+    try:
+        debounce_cache().set(scan_key(employee_pk), result, timeout=window)
+    except Exception:
+        pass
+
+
+def release_scan(employee_pk):
+    """Give the window back after the claiming scan failed to record"""
+    if not debounce_window():
+        return
+    try:
+        debounce_cache().delete(scan_key(employee_pk))
+    except Exception:
+        pass
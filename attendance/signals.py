@@ -0,0 +1,54 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .gallery_sync import publish_change
+from .models import AttendanceRecord, Employee, Site
+from .presence import forget_states
+
+
+@receiver(post_save, sender=Employee)
+def sync_employee_face(sender, instance, raw=False, **kwargs):
+    """Enroll, replace or drop the employee's template in every live recognizer and tell other processes"""
+    if raw:
+        return
+    
+    from .face_recognition_service import FaceRecognitionService
+    for service in list(FaceRecognitionService.live_services):
+        service.sync_employee(instance)
+    publish_change(employee_pks=[instance.pk])
+
+
+@receiver(post_delete, sender=Employee)
+def remove_employee_face(sender, instance, **kwargs):
+    """Drop a deleted employee from every live recognizer"""
+    from .face_recognition_service import FaceRecognitionService
+    for service in list(FaceRecognitionService.live_services):
+        service.remove_employee(instance.pk)
+    publish_change(employee_pks=[instance.pk])
+
+
+@receiver(m2m_changed, sender=Employee.sites.through)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def invalidate_site_galleries(sender, **kwargs):
+    """Site membership changed, so cached site shards must be re-cut"""
+    if kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    
+    from .face_recognition_service import FaceRecognitionService
+    for service in list(FaceRecognitionService.live_services):
+        service.invalidate_site_galleries()
+    publish_change(sites=True)
+
+
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+def forget_presence(sender, instance, raw=False, **kwargs):
+    """
+    A record was added, edited or removed outside the scan path (e.g. in the admin);
+    rebuild the employee's day state on the next scan. Scans mark their records
+    presence_tracked, as they cache the new state themselves.
+    """
+    if raw or getattr(instance, 'presence_tracked', False):
+        return
+    forget_states([instance.employee_id])
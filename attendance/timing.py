@@ -0,0 +1,67 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Stage name -> seconds spent, for the scan being handled in this context; None when not collecting
+_timings = ContextVar('scan_timings', default=None)
+
+
+def timings_enabled():
+    return getattr(settings, 'ATTENDANCE_SCAN_TIMINGS', True)
+
+
+@contextmanager
+def collect_timings():
+    """Collect the stage timings of everything run inside the block; yields the stage -> seconds dict"""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a pipeline stage into the current collection
+    Costs one ContextVar lookup when nothing is collecting. A stage entered
+    several times in one scan (e.g. one detection per frame) accumulates.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def record_timings(stage_timings):
+    """Add timings collected elsewhere (e.g. in a pool worker) to the current collection"""
+    timings = _timings.get()
+    if timings is None:
+        return
+    for name, seconds in stage_timings.items():
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def server_timing_header(timings):
+    """Server-Timing header value, durations in milliseconds"""
+    return ', '.join(f'{name};dur={1000 * seconds:.1f}' for name, seconds in timings.items())
+
+
+def log_timings(timings, **fields):
+    """
+    Log a scan's stage timings with each stage as its own field
+    Fields are passed as `extra`, so JSON log formatters emit them as
+    timing_<stage>_ms keys next to the other fields.
+    """
+    stage_fields = {f'timing_{name}_ms': round(1000 * seconds, 1) for name, seconds in timings.items()}
+    logger.info('scan stages %s', server_timing_header(timings), extra={**fields, **stage_fields})
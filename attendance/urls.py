@@ -17,6 +17,8 @@ urlpatterns = [
     path('employees/<int:pk>/register-face/', web_views.register_face_view, name='register_face'),
     path('attendance/', web_views.attendance_check_view, name='attendance_check'),
     path('attendance/recognize/', web_views.face_recognition_web, name='face_recognition_web'),
+    path('attendance/recognize/batch/', web_views.face_recognition_batch_web, name='face_recognition_batch_web'),
+    path('attendance/verify/', web_views.face_verification_web, name='face_verification_web'),
     path('history/', web_views.attendance_history_view, name='attendance_history'),
     
     # Admin functionality URLs
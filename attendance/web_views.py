@@ -3,6 +3,7 @@ from django.views.generic import ListView, CreateView, DetailView, UpdateView, D
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Sum
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -14,12 +15,34 @@ from asgiref.sync import async_to_sync
 
 from .models import Employee, AttendanceRecord, AttendanceSummary
 from .face_recognition_service import face_service
+from . import recognition_pool
+from .presence import apply_record, forget_states, next_attendance_action, remember_states, today_states
+from .scan_debounce import claim_scan, release_scan, remember_scan
+from .timing import stage
 
 
-def update_attendance_summary_local(employee, date):
-    """Update or create attendance summary for an employee on a given date"""
-    from datetime import datetime, time as dt_time
+# Check-ins after this time of day mark the employee late
+STANDARD_START_TIME = time(9, 0)
+
+
+def summary_total_hours(date, check_in_time, check_out_time):
+    """Hours between check-in and check-out; a check-out earlier than the check-in is taken as the next day"""
+    from datetime import datetime, timedelta
     
+    if not check_in_time or not check_out_time:
+        return 0.0
+    check_in_dt = datetime.combine(date, check_in_time)
+    check_out_dt = datetime.combine(date, check_out_time)
+    if check_out_dt < check_in_dt:
+        check_out_dt += timedelta(days=1)
+    return (check_out_dt - check_in_dt).total_seconds() / 3600
+
+
+def attendance_summary_values(employee, date):
+    """
+    Summary fields for an employee's day, computed from all of that day's records
+    Returns: dict of AttendanceSummary field values, or None when there are no records
+    """
     # Get all records for this employee on this date
     records = AttendanceRecord.objects.filter(
         employee=employee,
@@ -27,7 +50,7 @@ def update_attendance_summary_local(employee, date):
     ).order_by('timestamp')
     
     if not records.exists():
-        return
+        return None
     
     # Find check-in and check-out times
     check_in_record = records.filter(attendance_type='check_in').first()
@@ -36,41 +59,80 @@ def update_attendance_summary_local(employee, date):
     check_in_time = check_in_record.timestamp.time() if check_in_record else None
     check_out_time = check_out_record.timestamp.time() if check_out_record else None
     
-    # Calculate total hours
-    total_hours = 0.0
-    if check_in_time and check_out_time:
-        # Convert to datetime for calculation
-        check_in_dt = datetime.combine(date, check_in_time)
-        check_out_dt = datetime.combine(date, check_out_time)
-        
-        # Handle case where check-out is next day
-        if check_out_dt < check_in_dt:
-            from datetime import timedelta
-            check_out_dt += timedelta(days=1)
-        
-        duration = check_out_dt - check_in_dt
-        total_hours = duration.total_seconds() / 3600
-    
-    # Determine if late (assuming 9:00 AM is standard start time)
-    standard_start = dt_time(9, 0)
-    is_late = check_in_time and check_in_time > standard_start
+    return {
+        'check_in_time': check_in_time,
+        'check_out_time': check_out_time,
+        'total_hours': summary_total_hours(date, check_in_time, check_out_time),
+        'is_present': bool(check_in_record),
+        'is_late': bool(check_in_time and check_in_time > STANDARD_START_TIME)
+    }
+
+
+def update_attendance_summary_local(employee, date):
+    """
+    Recompute an employee's summary for a date from all of that day's records
+    Scans update summaries incrementally (apply_attendance_record); this full
+    recompute repairs summaries that drifted, see repair_attendance_summaries.
+    """
+    values = attendance_summary_values(employee, date)
+    if values is None:
+        return
     
     # Update or create summary
     summary, created = AttendanceSummary.objects.update_or_create(
         employee=employee,
         date=date,
-        defaults={
-            'check_in_time': check_in_time,
-            'check_out_time': check_out_time,
-            'total_hours': total_hours,
-            'is_present': bool(check_in_record),
-            'is_late': is_late
-        }
+        defaults=values
     )
     
     return summary
 
 
+def lock_attendance_summaries(employees, date):
+    """
+    Lock the employees' summaries for a date, creating the missing ones
+    Must run inside a transaction; concurrent scans of the same employee
+    queue on the row lock until the holder commits.
+    Returns: dict of employee pk -> AttendanceSummary
+    """
+    summaries = {
+        summary.employee_id: summary
+        for summary in AttendanceSummary.objects.select_for_update().filter(employee__in=employees, date=date)
+    }
+    for employee in employees:
+        if employee.pk not in summaries:
+            # First scan of the day; get_or_create settles a race with another first scan
+            summaries[employee.pk], _ = AttendanceSummary.objects.select_for_update().get_or_create(
+                employee=employee, date=date
+            )
+    return summaries
+
+
+def apply_attendance_record(summary, attendance_record):
+    """
+    Fold one new record into its day's summary, in memory
+    The first check-in and the last check-out of the day are kept, so
+    applying each record as it is written matches the full recompute.
+    Returns: names of the fields that changed
+    """
+    record_time = attendance_record.timestamp.time()
+    changed = []
+    if attendance_record.attendance_type == 'check_in':
+        if summary.check_in_time is None or record_time < summary.check_in_time:
+            summary.check_in_time = record_time
+            summary.is_present = True
+            summary.is_late = record_time > STANDARD_START_TIME
+            changed += ['check_in_time', 'is_present', 'is_late']
+    elif summary.check_out_time is None or record_time > summary.check_out_time:
+        summary.check_out_time = record_time
+        changed.append('check_out_time')
+    
+    if changed:
+        summary.total_hours = summary_total_hours(summary.date, summary.check_in_time, summary.check_out_time)
+        changed.append('total_hours')
+    return changed
+
+
 def send_attendance_notification(employee, action, confidence_score):
     """Send real-time attendance notification via WebSocket"""
     channel_layer = get_channel_layer()
@@ -122,7 +184,7 @@ def home_view(request):
     total_hours = AttendanceSummary.objects.filter(date=today).aggregate(
         total=Sum('total_hours')
     )['total'] or 0
-    with_face_encoding = Employee.objects.exclude(face_encoding__isnull=True).exclude(face_encoding='').count()
+    with_face_encoding = Employee.objects.filter(face_template__isnull=False).count()
     
     # Recent activity
     recent_records = AttendanceRecord.objects.select_related('employee').order_by('-timestamp')[:5]
@@ -149,7 +211,7 @@ class EmployeeWebCreateView(CreateView):
     model = Employee
     template_name = 'employee_form.html'
     fields = ['employee_id', 'email', 'first_name', 'last_name', 'phone', 
-              'department', 'position', 'hire_date', 'profile_image', 'is_active']
+              'department', 'position', 'hire_date', 'sites', 'profile_image', 'is_active']
     success_url = reverse_lazy('employee_list')
     
     def get_context_data(self, **kwargs):
@@ -185,7 +247,7 @@ class EmployeeWebUpdateView(UpdateView):
     model = Employee
     template_name = 'employee_form.html'
     fields = ['employee_id', 'email', 'first_name', 'last_name', 'phone', 
-              'department', 'position', 'hire_date', 'profile_image', 'is_active']
+              'department', 'position', 'hire_date', 'sites', 'profile_image', 'is_active']
     success_url = reverse_lazy('employee_list')
     
     def get_context_data(self, **kwargs):
@@ -235,8 +297,221 @@ class EmployeeWebDeleteView(DeleteView):
 
 
 def attendance_check_view(request):
-    """Face recognition attendance check page"""
-    return render(request, 'attendance_check.html')
+    """Face recognition attendance check page; ?site=<code> pins the kiosk to a site"""
+    return render(request, 'attendance_check.html', {'site': request.GET.get('site', '')})
+
+
+# Most frames accepted by face_recognition_batch_web in one request
+MAX_BATCH_FRAMES = 32
+
+
+def record_attendance(employee, confidence_score, location=''):
+    """
+    Write path shared by every recognition/verification endpoint: pick the
+    action, create the record, update the summary and notify dashboards
+    The day's summary row is locked first, so concurrent scans of the same
+    employee are serialized and each picks its action from the state the
+    previous one left in the presence cache; the record and the summary
+    commit together.
+    Returns: (action, attendance_record)
+    """
+    today = timezone.now().date()
+    try:
+        with transaction.atomic():
+            with stage('attendance_write'):
+                summary = lock_attendance_summaries([employee], today)[employee.pk]
+                
+                # Determine attendance action from the cached state of the day
+                state = today_states([employee.pk], today)[employee.pk]
+                action = next_attendance_action(state)
+                
+                # Create attendance record; its day state is cached below, so the signal leaves the cache alone
+                attendance_record = AttendanceRecord(
+                    employee=employee,
+                    attendance_type=action,
+                    location=location,
+                    confidence_score=confidence_score
+                )
+                attendance_record.presence_tracked = True
+                attendance_record.save(force_insert=True)
+            
+            # Update summary
+            with stage('summary'):
+                changed = apply_attendance_record(summary, attendance_record)
+                if changed:
+                    summary.save(update_fields=changed)
+            
+            # Cached while the summary lock is held, so the next scan of the employee sees it
+            remember_states({employee.pk: apply_record(state, attendance_record)})
+    except Exception:
+        forget_states([employee.pk])
+        raise
+    
+    # Send real-time notification
+    with stage('notify'):
+        send_attendance_notification(employee, action, confidence_score)
+    
+    return action, attendance_record
+
+
+def record_attendance_bulk(matches, location=''):
+    """
+    record_attendance for several employees at once: their summaries are
+    locked in one query, the new records are inserted in one statement and
+    the summaries updated in one more
+    Args:
+        matches: list of (employee, confidence_score), one per employee
+    Returns: dict of employee pk -> (action, attendance_record)
+    """
+    if not matches:
+        return {}
+    
+    today = timezone.now().date()
+    employee_pks = [employee.pk for employee, _ in matches]
+    try:
+        with transaction.atomic():
+            with stage('attendance_write'):
+                summaries = lock_attendance_summaries([employee for employee, _ in matches], today)
+                states = today_states(employee_pks, today)
+                
+                attendance_records = [
+                    AttendanceRecord(
+                        employee=employee,
+                        attendance_type=next_attendance_action(states[employee.pk]),
+                        location=location,
+                        confidence_score=confidence_score
+                    )
+                    for employee, confidence_score in matches
+                ]
+                AttendanceRecord.objects.bulk_create(attendance_records)
+            
+            with stage('summary'):
+                changed_summaries = []
+                changed_fields = set()
+                for attendance_record in attendance_records:
+                    summary = summaries[attendance_record.employee_id]
+                    changed = apply_attendance_record(summary, attendance_record)
+                    if changed:
+                        changed_summaries.append(summary)
+                        changed_fields.update(changed)
+                if changed_summaries:
+                    AttendanceSummary.objects.bulk_update(changed_summaries, sorted(changed_fields))
+            
+            remember_states({
+                record.employee_id: apply_record(states[record.employee_id], record) for record in attendance_records
+            })
+    except Exception:
+        forget_states(employee_pks)
+        raise
+    
+    with stage('notify'):
+        for attendance_record in attendance_records:
+            send_attendance_notification(
+                attendance_record.employee, attendance_record.attendance_type, attendance_record.confidence_score
+            )
+    
+    return {record.employee_id: (record.attendance_type, record) for record in attendance_records}
+
+
+def attendance_payload(employee, action, attendance_record, confidence_score):
+    """Result of a successful scan as reported to kiosks"""
+    return {
+        'success': True,
+        'employee_name': f'{employee.first_name} {employee.last_name}',
+        'employee_id': employee.employee_id,
+        'action': action.replace('_', ' ').title(),
+        'timestamp': attendance_record.timestamp.isoformat(),
+        'confidence': confidence_score
+    }
+
+
+def scan_pending_payload(employee):
+    """Reported when a concurrent scan of the same employee is still being recorded"""
+    return {
+        'success': False,
+        'message': 'Attendance is already being recorded, please wait',
+        'employee_name': f'{employee.first_name} {employee.last_name}',
+        'employee_id': employee.employee_id,
+    }
+
+
+def scan_unknown_payload(confidence_score):
+    """Reported when the matched employee was deleted before the scan was recorded"""
+    return {'success': False, 'message': 'Face not recognized', 'confidence': confidence_score}
+
+
+def record_scan(employee_pk, confidence_score, location='', employee=None):
+    """
+    record_attendance behind the per-employee debounce window
+    The window is claimed on the matched pk before the employee is loaded: a
+    scan inside ATTENDANCE_DEBOUNCE_SECONDS of the employee's last recorded
+    scan gets that scan's result back, marked duplicate, without a query,
+    a record, a summary update or a dashboard notification.
+    Args:
+        employee: the Employee when the caller already has it, loaded otherwise
+    Returns: payload for the kiosk
+    """
+    with stage('debounce'):
+        claimed, previous = claim_scan(employee_pk)
+    if not claimed and previous:
+        return {**previous, 'duplicate': True}
+    
+    if employee is None:
+        employee = Employee.objects.filter(pk=employee_pk).first()
+    if employee is None:
+        if claimed:
+            release_scan(employee_pk)
+        return scan_unknown_payload(confidence_score)
+    if not claimed:
+        return scan_pending_payload(employee)
+    
+    try:
+        action, attendance_record = record_attendance(employee, confidence_score, location=location)
+    except Exception:
+        release_scan(employee_pk)
+        raise
+    
+    payload = attendance_payload(employee, action, attendance_record, confidence_score)
+    remember_scan(employee_pk, payload)
+    return payload
+
+
+def parse_scan_request(request):
+    """
+    Pull the camera frame and its parameters out of a kiosk request
+    Accepts a JSON body with a base64 data URL in image_base64, a multipart
+    upload with the frame in the "image" file field, or a raw JPEG body
+    (application/octet-stream or image/*) with parameters in the query string.
+    Returns: (image, params) where image is raw bytes, a data URL or None
+    """
+    content_type = request.content_type or ''
+    if content_type == 'multipart/form-data':
+        upload = request.FILES.get('image')
+        return (upload.read() if upload else None), request.POST
+    if content_type == 'application/octet-stream' or content_type.startswith('image/'):
+        return (request.body or None), request.GET
+    data = json.loads(request.body)
+    return data.get('image_base64'), data
+
+
+def parse_batch_request(request):
+    """
+    Pull a batch of frames and their parameters out of a kiosk request
+    Accepts a JSON body {"frames": [{"image_base64": ..., "subject": ...}, ...]}
+    or a multipart upload with several "image" files and one "subject" field
+    per file. Frames without a subject are treated as one person.
+    Returns: (list of (subject, image), params)
+    """
+    if request.content_type == 'multipart/form-data':
+        subjects = request.POST.getlist('subject')
+        frames = [
+            (subjects[i] if i < len(subjects) else '', upload.read())
+            for i, upload in enumerate(request.FILES.getlist('image'))
+        ]
+        return frames, request.POST
+    data = json.loads(request.body)
+    frames = [(str(frame.get('subject') or ''), frame.get('image_base64')) for frame in data.get('frames', [])]
+    return frames, data
 
 
 @csrf_exempt
@@ -244,60 +519,113 @@ def face_recognition_web(request):
     """Handle face recognition for web interface"""
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            image_base64 = data.get('image_base64')
+            image, data = parse_scan_request(request)
+            site = data.get('site') or None
             
-            if not image_base64:
+            if not image:
                 return JsonResponse({'success': False, 'message': 'No image provided'})
             
-            # Recognize face
-            employee, confidence_score, message = face_service.recognize_face(image_base64)
+            # Recognize face in the recognition pool, searching only the kiosk's site when one is given
+            employee_pk, confidence_score, message = recognition_pool.recognize_face(image, site=site)
             
-            if employee is None:
+            if employee_pk is None:
                 return JsonResponse({
                     'success': False, 
                     'message': message,
                     'confidence': confidence_score
                 })
             
-            # Determine attendance action
-            today = timezone.now().date()
-            existing_records = AttendanceRecord.objects.filter(
-                employee=employee, 
-                date=today
-            ).order_by('-timestamp')
+            return JsonResponse(record_scan(employee_pk, confidence_score, location=data.get('location') or site or ''))
             
-            # Check current status
-            latest_checkin = existing_records.filter(attendance_type='check_in').first()
-            latest_checkout = existing_records.filter(attendance_type='check_out').first()
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': f'Error: {str(e)}'})
+    
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+
+@csrf_exempt
+def face_recognition_batch_web(request):
+    """
+    Handle a burst of kiosk frames, or scans queued while offline, in one request
+    All frames are matched together; each subject is attributed to its
+    best-confidence frame and the attendance records are written in bulk.
+    """
+    if request.method == 'POST':
+        try:
+            frames, data = parse_batch_request(request)
+            frames = [(subject, image) for subject, image in frames if image]
+            site = data.get('site') or None
             
-            if not latest_checkin:
-                action = 'check_in'
-            elif not latest_checkout or latest_checkout.timestamp < latest_checkin.timestamp:
-                action = 'check_out'
-            else:
-                action = 'check_in'  # New check-in for the day
+            if not frames:
+                return JsonResponse({'success': False, 'message': 'No image provided'})
+            if len(frames) > MAX_BATCH_FRAMES:
+                return JsonResponse({'success': False, 'message': f'At most {MAX_BATCH_FRAMES} frames per request'})
             
-            # Create attendance record
-            attendance_record = AttendanceRecord.objects.create(
-                employee=employee,
-                attendance_type=action,
-                confidence_score=confidence_score
-            )
+            results = recognition_pool.recognize_faces([image for _, image in frames], site=site)
             
-            # Update summary
-            update_attendance_summary_local(employee, today)
+            # Keep each subject's best frame, preferring recognized ones
+            best = {}
+            for (subject, _), (employee_pk, confidence_score, message) in zip(frames, results):
+                current = best.get(subject)
+                if current is None or (employee_pk is not None, confidence_score) > (current[0] is not None, current[1]):
+                    best[subject] = (employee_pk, confidence_score, message)
+            
+            # An employee matched under several subjects is recorded once
+            matches = {}
+            for employee_pk, confidence_score, _ in best.values():
+                if employee_pk is not None and confidence_score > matches.get(employee_pk, -1):
+                    matches[employee_pk] = confidence_score
+            
+            # Employees inside their debounce window get their last result back, before anyone is loaded
+            payloads = {}
+            claimed, pending = [], []
+            for employee_pk, confidence_score in matches.items():
+                with stage('debounce'):
+                    is_new, previous = claim_scan(employee_pk)
+                if is_new:
+                    claimed.append(employee_pk)
+                elif previous:
+                    payloads[employee_pk] = {**previous, 'duplicate': True}
+                else:
+                    pending.append(employee_pk)
+            
+            # Only employees being recorded, or still pending, are loaded
+            employees = Employee.objects.in_bulk(claimed + pending)
+            for employee_pk in pending:
+                payloads[employee_pk] = (
+                    scan_pending_payload(employees[employee_pk]) if employee_pk in employees
+                    else scan_unknown_payload(matches[employee_pk])
+                )
+            recording = []
+            for employee_pk in claimed:
+                if employee_pk in employees:
+                    recording.append((employees[employee_pk], matches[employee_pk]))
+                else:
+                    release_scan(employee_pk)
+                    payloads[employee_pk] = scan_unknown_payload(matches[employee_pk])
             
-            # Send real-time notification
-            send_attendance_notification(employee, action, confidence_score)
+            try:
+                recorded = record_attendance_bulk(recording, location=data.get('location') or site or '')
+            except Exception:
+                for employee, _ in recording:
+                    release_scan(employee.pk)
+                raise
+            for employee, confidence_score in recording:
+                action, attendance_record = recorded[employee.pk]
+                payloads[employee.pk] = attendance_payload(employee, action, attendance_record, confidence_score)
+                remember_scan(employee.pk, payloads[employee.pk])
+            
+            subject_results = []
+            for subject, (employee_pk, confidence_score, message) in best.items():
+                if employee_pk is None:
+                    result = {'success': False, 'message': message, 'confidence': confidence_score}
+                else:
+                    result = payloads[employee_pk]
+                subject_results.append({'subject': subject, **result})
             
             return JsonResponse({
-                'success': True,
-                'employee_name': f'{employee.first_name} {employee.last_name}',
-                'employee_id': employee.employee_id,
-                'action': action.replace('_', ' ').title(),
-                'timestamp': attendance_record.timestamp.isoformat(),
-                'confidence': confidence_score
+                'success': any(payload['success'] for payload in payloads.values()),
+                'results': subject_results
             })
             
         except Exception as e:
@@ -306,6 +634,39 @@ def face_recognition_web(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 
+@csrf_exempt
+def face_verification_web(request):
+    """Handle 1:1 verification: a claimed employee ID (typed or badge/QR) plus a face check"""
+    if request.method == 'POST':
+        try:
+            image, data = parse_scan_request(request)
+            employee_id = data.get('employee_id')
+            
+            if not image:
+                return JsonResponse({'success': False, 'message': 'No image provided'})
+            if not employee_id:
+                return JsonResponse({'success': False, 'message': 'No employee ID provided'})
+            
+            # Compare the frame against the claimed employee's template only
+            employee, confidence_score, message = recognition_pool.verify_face(employee_id, image)
+            
+            if employee is None:
+                return JsonResponse({
+                    'success': False, 
+                    'message': message,
+                    'confidence': confidence_score
+                })
+            
+            return JsonResponse(record_scan(
+                employee.pk, confidence_score, location=data.get('location') or data.get('site') or '', employee=employee
+            ))
+            
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': f'Error: {str(e)}'})
+    
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+
 def attendance_history_view(request):
     """Attendance history page"""
     records = AttendanceRecord.objects.select_related('employee').order_by('-timestamp')[:50]
@@ -353,7 +714,7 @@ def admin_dashboard_view(request):
     # System statistics
     total_employees = Employee.objects.count()
     active_employees = Employee.objects.filter(is_active=True).count()
-    with_face_encoding = Employee.objects.exclude(face_encoding__isnull=True).exclude(face_encoding='').count()
+    with_face_encoding = Employee.objects.filter(face_template__isnull=False).count()
     face_encoding_percentage = round((with_face_encoding / total_employees * 100) if total_employees > 0 else 0, 1)
     
     # Today's stats
@@ -405,6 +766,15 @@ def maintenance_status(request):
     })
 
 
+def readiness_view(request):
+    """
+    Readiness probe for load balancers: 200 once this process has its
+    cascade and gallery (or warm pool workers) loaded, 503 while warming up
+    """
+    ready, details = recognition_pool.readiness()
+    return JsonResponse({'ready': ready, **details}, status=200 if ready else 503)
+
+
 def toggle_maintenance(request):
     """Toggle maintenance mode"""
     if not request.user.is_staff:
@@ -629,7 +999,7 @@ def hr_dashboard_view(request):
         'late_arrivals': 5,
         'department_stats': department_stats,
         'employee_performance': employee_performance,
-        'employees_no_face_encoding': Employee.objects.filter(Q(face_encoding__isnull=True) | Q(face_encoding='')).count(),
+        'employees_no_face_encoding': Employee.objects.filter(face_template__isnull=True).count(),
         'late_employees_today': 3,
         'absent_employees_today': absent_today,
         'top_performers': employee_performance[:5],
@@ -0,0 +1,12 @@
+import multiprocessing
+
+# Process pools (recognition, enrollment) spawn their workers, never fork them: pools are
+# started from request and background threads of processes with open DB connections, and
+# a forked worker would share the parent's connection and inherit locks other threads
+# held at that moment. Spawned workers import the pool's module before Django is set up,
+# so those modules import models and the recognition service only inside functions.
+
+
+def spawn_context():
+    """Multiprocessing context for worker pools"""
+    return multiprocessing.get_context('spawn')
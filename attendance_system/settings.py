@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'attendance.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -125,14 +127,84 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Face recognition
+# Trained gallery snapshot, memory-mapped read-only by every worker process; rebuilt
+# when the employee gallery changes. Keep it on a local disk, and out of MEDIA_ROOT:
+# it holds every employee's face template
+FACE_RECOGNIZER_SNAPSHOT_PATH = BASE_DIR / 'var' / 'recognizer' / 'gallery.bin'
+# Matching backend: 'lbph' (LBP histograms, chi-square) or 'pca' (Eigenfaces projection)
+FACE_RECOGNITION_BACKEND = 'lbph'
+FACE_RECOGNITION_PCA_COMPONENTS = 128
+# Face detection tuning (see FaceRecognitionService.DETECTION_DEFAULTS); frames are
+# downscaled to MAX_DIMENSION for the cascade and faces smaller than MIN_FACE_RATIO
+# of the frame are ignored
+FACE_DETECTION = {
+    'MAX_DIMENSION': 640,
+    'SCALE_FACTOR': 1.1,
+    'MIN_NEIGHBORS': 5,
+    'MIN_FACE_RATIO': 0.1,
+}
+# Kiosk streams (ws/attendance/recognize/) run full detection every DETECT_EVERY frames
+# and follow known faces in between; each face is matched once per track
+FACE_TRACKING = {
+    'DETECT_EVERY': 5,
+    'IOU_THRESHOLD': 0.3,
+    'MAX_MISSES': 2,
+}
+# When a kiosk sends its site, also search all employees if nobody at the site matches
+FACE_RECOGNITION_SITE_FALLBACK = False
+# Gallery change feed in Redis; every process re-reads only the employees changed
+# elsewhere on its next scan. Set to None to fall back to comparing DB versions.
+FACE_RECOGNITION_REDIS_URL = 'redis://127.0.0.1:6379/0'
+# Recognition runs in a pool of warm worker processes (see attendance.recognition_pool);
+# set WORKERS to the number of cores on production nodes, 0 runs it in the request thread
+FACE_RECOGNITION_POOL = {
+    'WORKERS': 0,
+    'MAX_QUEUE': 32,
+    'TIMEOUT': 10,
+    'MAX_TASKS_PER_WORKER': 500,
+}
+# Time each scan stage (decode, detection, matching, attendance writes, broadcasts) and
+# report it in a Server-Timing header and in log fields; False turns the timers off
+ATTENDANCE_SCAN_TIMINGS = True
+# Load the cascade and gallery (or start the pool) when the app starts rather than on
+# the first scan. Enable it on recognition servers only, e.g. in their service unit,
+# so migrations and other management commands stay fast.
+FACE_RECOGNITION_WARM_UP = os.environ.get('FACE_RECOGNITION_WARM_UP') == '1'
+# Raw JPEG kiosk uploads are read from request.body, which this caps; leave room for
+# full-resolution phone photos
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
 # Cache settings for maintenance mode
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'maintenance-mode-cache',
-    }
+    },
+    # Shared by every process, so all workers see each employee's debounce window and day state
+    'attendance': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'OPTIONS': {
+            'socket_timeout': 0.5,
+            'socket_connect_timeout': 0.5,
+        },
+    },
 }
 
+# Repeat scans of an employee within this many seconds of their last recorded scan
+# return that scan's result instead of toggling check-in/check-out; 0 disables
+ATTENDANCE_DEBOUNCE_SECONDS = 30
+ATTENDANCE_DEBOUNCE_CACHE = 'attendance'
+
+# Each employee's last action and first check-in of the day, read to choose between
+# check-in and check-out; must be shared by every process
+ATTENDANCE_PRESENCE_CACHE = 'attendance'
+
+# Uploads, logs and results of employee imports started from the admin, which run
+# import_employees in a process of their own; kept out of MEDIA_ROOT as they are not public
+EMPLOYEE_IMPORT_DIR = BASE_DIR / 'employee_imports'
+
 # CORS settings
 
 # Default primary key field type
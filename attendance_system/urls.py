@@ -27,6 +27,10 @@ urlpatterns = [
         path('admin/maintenance/status/', web_views.maintenance_status, name='api_maintenance_status'),
         path('admin/maintenance/toggle/', web_views.toggle_maintenance, name='api_toggle_maintenance'),
         path('admin/cache/clear/', web_views.clear_cache_view, name='api_clear_cache'),
+        path('health/ready/', web_views.readiness_view, name='api_readiness'),
+        path('attendance/face-recognition/', web_views.face_recognition_web, name='api_face_recognition'),
+        path('attendance/face-recognition/batch/', web_views.face_recognition_batch_web, name='api_face_recognition_batch'),
+        path('attendance/face-verification/', web_views.face_verification_web, name='api_face_verification'),
     ])),
 ]
 
@@ -38,7 +38,7 @@ def fix_employee_face_encoding(employee_id):
                 
                 # Verify encoding was saved
                 employee.refresh_from_db()
-                if employee.face_encoding:
+                if employee.face_template:
                     print(f"✅ Face encoding verified in database")
                     return True
                 else:
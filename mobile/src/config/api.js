@@ -17,6 +17,7 @@ export const endpoints = {
   employeeDetail: (id) => `/employees/${id}/`,
   registerFace: (employeeId) => `/employees/${employeeId}/register-face/`,
   faceRecognitionAttendance: '/attendance/face-recognition/',
+  faceVerificationAttendance: '/attendance/face-verification/',
   attendanceRecords: '/attendance/records/',
   attendanceSummaries: '/attendance/summaries/',
   employeeAttendanceToday: (employeeId) => `/employees/${employeeId}/attendance/today/`,
@@ -36,11 +37,18 @@ export const apiService = {
     api.post(endpoints.registerFace(employeeId), { image_base64: imageBase64 }),
   
   // Attendance
-  faceRecognitionAttendance: (imageBase64, attendanceType, location = '') =>
+  faceRecognitionAttendance: (imageBase64, attendanceType, location = '', site = '') =>
     api.post(endpoints.faceRecognitionAttendance, {
       image_base64: imageBase64,
       attendance_type: attendanceType,
       location: location,
+      site: site,
+    }),
+  faceVerificationAttendance: (employeeId, imageBase64, location = '') =>
+    api.post(endpoints.faceVerificationAttendance, {
+      employee_id: employeeId,
+      image_base64: imageBase64,
+      location: location,
     }),
   
   // Records and summaries